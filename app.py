@@ -6,7 +6,9 @@ from chat_history import ChatHistory, ChatLogger
 from self_prompt import ConversationPrompter
 from voice_commands import VoiceCommandManager
 from user_profile_manager import UserProfileManager, EnhancedPreferenceExtractor
-from memory import MemoryManager
+from memory import MemoryManager, MemoryPrefetcher
+from barge_in import BargeInController
+from stt_pipeline import EchoReference
 import time
 import logging
 import json
@@ -30,14 +32,23 @@ profile_manager = UserProfileManager(
 )
 memory_manager = MemoryManager(profile_manager=profile_manager)
 memory_manager.start()
+# Memory search starts on interim transcripts, before Lumi finishes talking;
+# bunny.set_user_id() passes user switches on to it
+memory_prefetcher = MemoryPrefetcher(memory_manager, user_id="lumi")
+memory_prefetcher.start()
+
+# Bunny's voice is cancelled from the mic, so Lumi can talk over her
+echo_reference = EchoReference(sample_rate=16000)
 
 stt = SpeechToText(
     model_size="small",
     device="cuda",
-    compute_type="float16"
+    compute_type="float16",
+    echo_reference=echo_reference
 )
 
 tts = TTSEngine(voice="en-US-AnaNeural", speed=1.15)
+tts.set_echo_reference(echo_reference)
 tts.start()
 
 bunny = BunnyCompletions(
@@ -48,18 +59,34 @@ bunny = BunnyCompletions(
     profile_manager=profile_manager,
     chat_logger=chat_logger,
     memory_manager=memory_manager,
-    default_user_id="lumi"
+    default_user_id="lumi",
+    memory_prefetcher=memory_prefetcher
 )
 
 prompter = ConversationPrompter(bunny, min_seconds=10, max_seconds=30, tts_engine=tts)
 bunny.prompter = prompter
 voice_manager = VoiceCommandManager()
 
+barge_in = BargeInController(bunny, tts, policy="words", prompter=prompter)
+
+def handle_voice_activity_started():
+    prompter.on_voice_activity_started()
+    barge_in.on_voice_activity_started()
+
+def handle_voice_activity_ended():
+    prompter.on_voice_activity_ended()
+    barge_in.on_voice_activity_ended()
+
+def handle_interim_result(text):
+    memory_prefetcher.on_interim_result(text)
+    barge_in.on_interim_result(text)
+
 tts.set_prompter(prompter)
 tts.on_playback_started = stt.on_tts_started
 tts.on_playback_finished = stt.on_tts_finished
-stt.on_voice_activity_started = prompter.on_voice_activity_started
-stt.on_voice_activity_ended = prompter.on_voice_activity_ended
+stt.on_voice_activity_started = handle_voice_activity_started
+stt.on_voice_activity_ended = handle_voice_activity_ended
+stt.on_interim_result = handle_interim_result
 
 transcription_history = []
 llm_responses = []
@@ -0,0 +1,82 @@
+import threading
+import time
+
+class BargeInController:
+    """Cuts Bunny off when Lumi starts talking over her.
+
+    policy is one of:
+      "off"       - never interrupt; Bunny finishes what she is saying. With
+                    echo cancellation (as app.py sets up) Lumi's speech is
+                    still transcribed meanwhile and queued as the next turn;
+                    without it, STT holds finals back until TTS ends
+      "immediate" - interrupt as soon as voice activity starts
+      "words"     - interrupt once an interim transcript has min_words words,
+                    so coughs and background noise don't cut Bunny off
+
+    Interrupting stops playback, drops queued and in-flight TTS requests,
+    cancels the LM Studio stream and trims the chat history to what was
+    actually spoken. Without echo cancellation (SpeechToText echo_reference)
+    Bunny's own voice can trigger it, so use headphones or the "off" policy
+    on open speakers."""
+
+    POLICIES = ("off", "immediate", "words")
+
+    def __init__(self, bunny, tts, policy="words", min_words=2, interrupt_generation=True, prompter=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown barge-in policy: {policy}")
+        self.bunny = bunny
+        self.tts = tts
+        self.policy = policy
+        self.min_words = min_words
+        # Also cancel a reply that is still generating but not yet audible
+        self.interrupt_generation = interrupt_generation
+        # Told when a turn is cut off, since its reply never finishes playing
+        self.prompter = prompter
+        self.interruptions = 0
+        self.on_barge_in = None
+        self._voice_active = False
+        self._lock = threading.Lock()
+
+    def is_bunny_active(self):
+        # Sentences still queued or synthesizing count too, so a reply can be
+        # cut off before its first sentence plays
+        if self.tts.has_pending_speech():
+            return True
+        return self.interrupt_generation and self.bunny.is_generating()
+
+    def on_voice_activity_started(self):
+        self._voice_active = True
+        if self.policy == "immediate" and self.is_bunny_active():
+            # Called from the STT thread, which must keep consuming audio
+            threading.Thread(target=self.barge_in, daemon=True).start()
+
+    def on_voice_activity_ended(self):
+        self._voice_active = False
+
+    def on_interim_result(self, text):
+        if self.policy != "words" or not self._voice_active:
+            return
+        if len(text.split()) >= self.min_words and self.is_bunny_active():
+            threading.Thread(target=self.barge_in, daemon=True).start()
+
+    def barge_in(self):
+        # Serialized so a burst of triggers interrupts once
+        with self._lock:
+            if not self.is_bunny_active():
+                return False
+            
+            started = time.time()
+            response_id, spoken = self.tts.interrupt()
+            if response_id is None:
+                # Nothing of the reply reached TTS; only its generation stops
+                self.bunny.interrupt()
+            else:
+                self.bunny.interrupt(response_id, spoken)
+            self.interruptions += 1
+            if self.prompter:
+                self.prompter.on_turn_interrupted()
+            print(f"\n✋ Barge-in: Bunny cut off after \"{spoken}\" ({(time.time() - started) * 1000:.0f}ms)")
+        
+        if self.on_barge_in:
+            self.on_barge_in(spoken)
+        return True
@@ -3,9 +3,16 @@ import queue
 import time
 import lmstudio as lms
 from chat_history import ChatHistory
+from context_window import ContextWindow
+from prompt_assembler import PromptAssembler
+
+# Queued by stop() so the worker wakes up from its blocking get and exits
+_SHUTDOWN = ("SHUTDOWN", None)
 
 class BunnyCompletions:
-    def __init__(self, server_api_host, model_name, chat_history=None, tts_engine=None, profile_manager=None, chat_logger=None, memory_manager=None, default_user_id="default_user"):
+    CONTINUATION_MARKERS = ["[continue]", "[thinking]", "[AI continues]", "[self-talk]"]
+
+    def __init__(self, server_api_host, model_name, chat_history=None, tts_engine=None, profile_manager=None, chat_logger=None, memory_manager=None, default_user_id="default_user", stream_tts=True, merge_window=0.3, max_prompt_tokens=None, response_token_reserve=512, memory_prefetcher=None):
         self.tts = tts_engine
         self.server_api_host = server_api_host
         self.model_name = model_name
@@ -14,11 +21,27 @@ class BunnyCompletions:
         self.profile_manager = profile_manager
         self.chat_logger = chat_logger
         self.memory_manager = memory_manager
+        # Optional MemoryPrefetcher; retrieval started on interim transcripts
+        self.memory_prefetcher = memory_prefetcher
         self.default_user_id = default_user_id
+        # Speak sentences as they are generated instead of after the full reply
+        self.stream_tts = stream_tts
 
+        # is_processing is True from the moment a turn is taken off the queue
+        # until it finishes. Input arriving meanwhile waits in the queue and
+        # is merged into the next turn; once input is arriving that fast, the
+        # worker also waits merge_window for stragglers before starting.
         self.is_processing = False
         self.processing_lock = threading.Lock()
-        self.pending_text = None
+        self.merge_window = merge_window
+        # Barge-in: the prediction being streamed, the TTS response it feeds,
+        # and (tts response id, history index) of the last finished reply
+        self._prediction_stream = None
+        self._turn_tts_id = None
+        self._interrupted = False
+        self._spoken_on_interrupt = ""
+        self._interrupt_lock = threading.Lock()
+        self._last_turn = None
         self._initialize_client()
         
         if chat_history:
@@ -27,7 +50,28 @@ class BunnyCompletions:
             system_prompt = "Your name is Bunny. Your nicknames are Bun and Bun Bun. You are an AI VTuber. The user is your creator: Lumi. You can say whatever you want. You can do whatever you want. It is okay to use profanity.  You are very cute. You are snarky. You are sometimes sassy. You are a little friendly. You like swearing. You basically have no filter. You will say whatever is on your mind. You enjoy being silly and random. Lumi is a female viera VTuber. Lumi has long blue hair and fluffy bunny ears. You enjoy talking with chat on Twitch. You stream on Twitch. Talk about whatever you think is entertaining. Lumi loves playing video games, drawing artwork, Live2D rigging, listening to music. Lumi is learning how to code in Python. You like using emojis within your messages. Keep your messages short and natural sounding. I don't want big long paragraphs as responses, it's a conversation not a monologue. When the user sends '...', it means they're still listening and you should continue your previous thought naturally."
             self.chat_history = ChatHistory(system_prompt)
         
-        self.chat = lms.Chat.from_history(self.chat_history.get_history())
+        # Only the persona, a running summary and the recent turns are sent;
+        # older turns are summarized in the background to stay in budget
+        self.context = ContextWindow(
+            self.chat_history,
+            token_counter=self._count_tokens,
+            summarizer=self._summarize_history,
+            max_prompt_tokens=max_prompt_tokens or self._default_prompt_budget(response_token_reserve)
+        )
+        self.prompt = PromptAssembler(self.context)
+        self.last_prompt_tokens = None
+        self.last_first_token_seconds = None
+        
+        # The lmstudio Chat mirrors the stable part of the prompt and is only
+        # appended to each turn; it is rebuilt from scratch only when the
+        # window moves, the prefix changes or an old message is edited
+        self.chat = None
+        self._chat_source = None
+        self._chat_key = None
+        self._chat_synced = 0
+        self._chat_tail = False
+        self.chat_stats = {"rebuilds": 0, "appended": 0, "last_prepare_seconds": 0.0}
+        self._sync_chat()
         
         self.work_queue = queue.Queue()
         self.processing_thread = None
@@ -47,6 +91,10 @@ class BunnyCompletions:
         if self.is_running:
             print("\n[BUNNY] Already running")
             return
+        if self.processing_thread and self.processing_thread.is_alive():
+            # A previous stop() is still finishing its turn; it keeps serving
+            self.is_running = True
+            return
             
         self.is_running = True
         self.processing_thread = threading.Thread(target=self._process_queue)
@@ -60,6 +108,7 @@ class BunnyCompletions:
             return
             
         self.is_running = False
+        self.work_queue.put(_SHUTDOWN)
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2)
         print("\n[BUNNY] Service stopped")
@@ -67,50 +116,187 @@ class BunnyCompletions:
     def set_user_id(self, user_id):
         if user_id and isinstance(user_id, str) and user_id.strip():
             self.default_user_id = user_id.strip()
+            if self.memory_prefetcher:
+                self.memory_prefetcher.set_user_id(self.default_user_id)
             print(f"\n[BUNNY] User ID set to: {self.default_user_id}")
             return True
         return False
     
+    def _default_prompt_budget(self, response_token_reserve):
+        try:
+            return self.model.get_context_length() - response_token_reserve
+        except Exception:
+            return 3072
+
+    def _count_tokens(self, text):
+        if self.model is None:
+            return ContextWindow.estimate_tokens(text)
+        return self.model.count_tokens(text)
+
+    def _summarize_history(self, previous_summary, messages):
+        # Runs on the context window's background thread
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages if message["role"] != "system")
+        chat = lms.Chat("You keep a running summary of a conversation between Bunny, an AI VTuber, and the people she talks to. Keep names, facts, preferences, running jokes and unfinished topics. Write plain prose, no lists, at most 150 words.")
+        chat.add_user_message(f"Summary so far:\n{previous_summary or '(nothing yet)'}\n\nConversation to add:\n{transcript}\n\nWrite the updated summary.")
+        result = self.model.respond(chat, config={"maxTokens": self.context.summary_max_tokens, "temperature": 0.3})
+        return result.content
+
+    def _sync_chat(self, tail_context=None):
+        # Returns the Chat to send: the mirror, with the per-request context
+        # appended until _drop_tail() takes it off again
+        started = time.perf_counter()
+        self._drop_tail()
+        history = self.chat_history
+        messages = history.messages
+        prefix, start, tail = self.prompt.assemble(tail_context)
+        key = (history.revision, self.context.revision, start)
+        if (self.chat is None or self._chat_source is not history
+                or self._chat_key != key or self._chat_synced > len(messages)):
+            self.chat = lms.Chat.from_history({"messages": prefix + messages[start:]})
+            self._chat_source = history
+            self._chat_key = key
+            self.chat_stats["rebuilds"] += 1
+        else:
+            for message in messages[self._chat_synced:]:
+                self.chat.append(message)
+                self.chat_stats["appended"] += 1
+        self._chat_synced = len(messages)
+        if tail:
+            self.chat.append(tail)
+            self._chat_tail = True
+        self.chat_stats["last_prepare_seconds"] = time.perf_counter() - started
+        return self.chat
+
+    def _drop_tail(self):
+        # respond_stream() serializes the history when it is called, so the
+        # tail can come off right after. Chat has no public way to remove a
+        # message; if the internals change, the mirror is rebuilt instead
+        if not self._chat_tail:
+            return
+        self._chat_tail = False
+        try:
+            self.chat._messages.pop()
+        except (AttributeError, IndexError):
+            self._chat_key = None
+
+    def _report_prompt_tokens(self, prediction_stream):
+        # The server's own count when the prediction finished normally
+        try:
+            self.last_prompt_tokens = prediction_stream.result().stats.prompt_tokens_count
+        except Exception:
+            self.last_prompt_tokens = None
+        first_token = f"{self.last_first_token_seconds * 1000:.0f} ms" if self.last_first_token_seconds is not None else "?"
+        print(f"[BUNNY] Prompt tokens: {self.context.last_prompt_tokens} estimated, {self.last_prompt_tokens if self.last_prompt_tokens is not None else '?'} reported / budget {self.context.max_prompt_tokens}, "
+              f"prefix reuse {self.prompt.last_reuse_ratio:.0%}, first token {first_token}")
+
+    def is_generating(self):
+        return self._prediction_stream is not None
+
+    def interrupt(self, tts_response_id=None, spoken_text=""):
+        # Stops the reply being generated and trims the history to what the
+        # listener actually heard of it
+        with self._interrupt_lock:
+            stream = self._prediction_stream
+            if stream is not None:
+                self._interrupted = True
+                heard = tts_response_id is not None and tts_response_id == self._turn_tts_id
+                self._spoken_on_interrupt = spoken_text if heard else ""
+            last_turn = self._last_turn
+        
+        if stream is not None and hasattr(stream, 'cancel'):
+            try:
+                stream.cancel()
+            except Exception as e:
+                print(f"\n[BUNNY ERROR] Failed to cancel generation: {str(e)}")
+        
+        # The previous reply may already be in the history while still playing
+        if last_turn and tts_response_id is not None and last_turn[0] == tts_response_id:
+            self._last_turn = None
+            _, index = last_turn
+            if spoken_text:
+                self.chat_history.replace_message(index, spoken_text + " —")
+            else:
+                self.chat_history.remove_message(index)
+            print(f"\n[BUNNY] Reply cut off, history keeps: {spoken_text}")
+        
+        return stream is not None
+
     def add_to_queue(self, text):
+        # Returns True if the text starts a turn right away, False if it was
+        # merged into the next one (or dropped, for a continuation while busy)
+        is_continuation = text in self.CONTINUATION_MARKERS
         with self.processing_lock:
-            if self.is_processing:
-                if self.pending_text:
-                    self.pending_text += " " + text
-                else:
-                    self.pending_text = text
-                print("AI is busy, appending to pending text")
+            busy = self.is_processing or not self.work_queue.empty()
+            if is_continuation and busy:
+                # A self-prompt is stale once anything else is happening
                 return False
-            else:
-                # Log all user messages including continuation markers
-                if self.chat_logger:
-                    self.chat_logger.append_to_log("user", text)
-                    
-                continuation_markers = ["[continue]", "[thinking]", "[AI continues]", "[self-talk]"]
-                if text in continuation_markers:
-                    self.work_queue.put(("CONTINUE", text))
+            
+            # Log all user messages including continuation markers
+            if self.chat_logger:
+                self.chat_logger.append_to_log("user", text)
+            
+            self.work_queue.put(("CONTINUE" if is_continuation else "USER", text))
+        
+        if busy:
+            print("AI is busy, text will be merged into the next turn")
+        return not busy
+    
+    def _collect_turn(self, first):
+        # Everything already queued joins this turn. If that was anything at
+        # all, input is arriving faster than turns, so keep collecting until
+        # merge_window passes without more.
+        items = [first]
+        deadline = None
+        while True:
+            try:
+                if deadline is None:
+                    item = self.work_queue.get_nowait()
                 else:
-                    # Regular user message
-                    self.work_queue.put(("USER", text))
-                return True
+                    item = self.work_queue.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                if deadline is None and len(items) > 1 and self.merge_window > 0:
+                    deadline = time.time() + self.merge_window
+                    continue
+                break
+            if item is _SHUTDOWN:
+                self.work_queue.put(item)
+                break
+            items.append(item)
+            if deadline is not None:
+                deadline = time.time() + self.merge_window
+        
+        user_texts = [text for msg_type, text in items if msg_type == "USER"]
+        if user_texts:
+            if len(user_texts) > 1:
+                print(f"\n[BUNNY] Merged {len(user_texts)} inputs into one turn")
+            return "USER", " ".join(user_texts)
+        return items[-1]
     
     def _process_queue(self):
-        while self.is_running:
+        while True:
+            item = self.work_queue.get()
+            if item is _SHUTDOWN:
+                if self.is_running:
+                    # start() was called again before this stop() took effect
+                    continue
+                break
+            
+            with self.processing_lock:
+                self.is_processing = True
             try:
-                if not self.work_queue.empty():
-                    msg_type, text = self.work_queue.get()
-                    
-                    if msg_type == "CONTINUE":
-                        continuation_prompt = "..."
-                        self._get_streaming_completion(continuation_prompt)
-                    else:
-                        # Regular user message
-                        self._get_streaming_completion(text)
-                        
-
+                msg_type, text = self._collect_turn(item)
+                
+                if msg_type == "CONTINUE":
+                    continuation_prompt = "..."
+                    self._get_streaming_completion(continuation_prompt)
+                else:
+                    # Regular user message
+                    self._get_streaming_completion(text)
             except Exception as e:
                 print(f"[BUNNY ERROR] Error processing queue: {str(e)}")
-                
-            time.sleep(0.1)
+            finally:
+                with self.processing_lock:
+                    self.is_processing = False
     
     def _get_streaming_completion(self, user_text):
         try:
@@ -118,25 +304,62 @@ class BunnyCompletions:
 
             memory_context = None
             if self.memory_manager:
-                memory_context = self.memory_manager.get_memory_context(
+                if self.prompt.profile_due():
+                    self.prompt.update_profile(self.memory_manager.get_profile_context(self.default_user_id))
+                retriever = self.memory_prefetcher or self.memory_manager
+                memory_context = retriever.get_retrieved_context(
                     self.default_user_id, user_text)
             
-            # If we have relevant memories, add them as system message
-            if memory_context:
-                self.chat_history.add_system_message(memory_context)
-            
-            self.chat = lms.Chat.from_history(self.chat_history.get_history())
+            # Relevant memories go after the newest message for this request
+            # only; they are looked up again next turn, so they aren't kept
+            # in history
+            chat = self._sync_chat(memory_context)
             
             # Generate the assistant's response
             full_response = ""
-            prediction_stream = self.model.respond_stream(self.chat)
+            requested = time.perf_counter()
+            self.last_first_token_seconds = None
+            try:
+                prediction_stream = self.model.respond_stream(chat)
+            finally:
+                self._drop_tail()
             
-            for fragment in prediction_stream:
-                full_response += fragment.content
-                if self.on_stream_fragment:
-                    self.on_stream_fragment(fragment.content)
+            streaming_to_tts = self.tts and self.stream_tts and hasattr(self.tts, 'feed_stream')
+            with self._interrupt_lock:
+                self._prediction_stream = prediction_stream
+                self._interrupted = False
+                self._turn_tts_id = self.tts.begin_stream() if streaming_to_tts else None
             
-            self.chat_history.add_assistant_message(full_response)
+            try:
+                for fragment in prediction_stream:
+                    if self._interrupted:
+                        break
+                    if self.last_first_token_seconds is None:
+                        self.last_first_token_seconds = time.perf_counter() - requested
+                    full_response += fragment.content
+                    if self.on_stream_fragment:
+                        self.on_stream_fragment(fragment.content)
+                    if streaming_to_tts:
+                        self.tts.feed_stream(fragment.content)
+            finally:
+                with self._interrupt_lock:
+                    self._prediction_stream = None
+                if streaming_to_tts:
+                    self.tts.end_stream()
+            
+            self._report_prompt_tokens(prediction_stream)
+            
+            interrupted = self._interrupted
+            if interrupted:
+                # Only what was spoken before the user cut in is kept
+                full_response = self._spoken_on_interrupt + " —" if self._spoken_on_interrupt else ""
+                print(f"\n[BUNNY] Generation interrupted, history keeps: {self._spoken_on_interrupt}")
+            
+            if full_response:
+                self.chat_history.add_assistant_message(full_response)
+                if not interrupted:
+                    message_index = len(self.chat_history.messages) - 1
+                    self._last_turn = (self._turn_tts_id, message_index)
 
             # Process the conversation for memory extraction
             if self.memory_manager and user_text:
@@ -152,11 +375,14 @@ class BunnyCompletions:
             if self.on_completion and full_response:
                 self.on_completion(full_response)
             
-            if self.tts and full_response:
-                self.tts.add_to_queue(full_response)
+            if self.tts and full_response and not streaming_to_tts and not interrupted:
+                self._turn_tts_id = self.tts.add_to_queue(full_response)
+                self._last_turn = (self._turn_tts_id, message_index)
             
             print(f"[BUNNY FINAL] {full_response}")
             
+            self.context.maybe_compact()
+            
             return full_response
                 
         except Exception as e:
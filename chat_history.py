@@ -62,6 +62,9 @@ class ChatHistory:
     
     def __init__(self, system_prompt=None):
         self.messages = []
+        # Bumped by any change other than an append, so mirrors of the
+        # history (e.g. the lmstudio Chat) know when to rebuild
+        self.revision = 0
         if system_prompt:
             self.add_system_message(system_prompt)
     
@@ -77,11 +80,23 @@ class ChatHistory:
         self.messages.append({"role": "assistant", "content": content})
         return self
     
+    def replace_message(self, index, content):
+        # Used when a reply is cut off and only part of it was spoken
+        self.messages[index]["content"] = content
+        self.revision += 1
+        return self
+    
+    def remove_message(self, index):
+        del self.messages[index]
+        self.revision += 1
+        return self
+    
     def get_history(self):
         return {"messages": self.messages}
     
     def clear(self):
         self.messages = []
+        self.revision += 1
         return self
     
     def get_last_n_messages(self, n=1):
@@ -0,0 +1,248 @@
+import collections
+import threading
+
+class ContextWindow:
+    """Keeps the prompt sent to the model inside a token budget.
+
+    ChatHistory still holds the whole conversation for logs and the UI. The
+    prompt is the persona system prompt with the user profile and a running
+    summary of everything folded out of the window, then the most recent
+    messages. Per-request context (retrieved memories) is counted against the
+    budget but never stored in the history, so it is only ever sent once.
+    When the window goes over max_prompt_tokens, its oldest turns are folded
+    into the summary on a background thread, bringing it down to
+    target_ratio of the budget. Until that summary is ready the oldest
+    messages are dropped from the prompt instead, so a request never goes
+    over the budget.
+
+    token_counter(text) -> int and summarizer(previous_summary, messages) ->
+    str are supplied by the caller; without a summarizer old turns are
+    dropped rather than summarized. token_counter may be a round trip to the
+    server, so it only runs on the background thread that maybe_compact()
+    starts after a turn; until a message has been counted there, prepare()
+    and maybe_compact() use an estimate. Exact counts are kept for the
+    token_cache_size most recently used messages."""
+
+    # Rough per-message cost of the chat template's role markers
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, chat_history, token_counter=None, summarizer=None, max_prompt_tokens=3072, target_ratio=0.6, summary_max_tokens=300, token_cache_size=512):
+        self.chat_history = chat_history
+        self.token_counter = token_counter or self.estimate_tokens
+        self.summarizer = summarizer
+        self.max_prompt_tokens = max_prompt_tokens
+        self.target_ratio = target_ratio
+        self.summary_max_tokens = summary_max_tokens
+
+        self.summary = ""
+        self.profile = ""
+        # history.messages[window_start:] is the live window; it starts after
+        # the persona, if the history has one
+        self.window_start = self._first_index()
+        # Bumped whenever the prefix (profile, summary) or window_start changes
+        self.revision = 0
+        self.last_prompt_tokens = 0
+        self.stats = {"summaries": 0, "folded_messages": 0, "trimmed_requests": 0, "summary_failures": 0}
+
+        # (role, content) -> exact token count, least recently used first
+        self._token_cache = collections.OrderedDict()
+        self.token_cache_size = token_cache_size
+        self._cache_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._summary_thread = None
+        self._history_revision = chat_history.revision
+        self._history_messages = chat_history.messages
+
+    @staticmethod
+    def estimate_tokens(text):
+        return len(text) // 4 + 1
+
+    def count(self, message, exact=True):
+        key = (message["role"], message["content"])
+        with self._cache_lock:
+            tokens = self._token_cache.get(key)
+            if tokens is not None:
+                self._token_cache.move_to_end(key)
+                return tokens
+        if not exact:
+            return self.estimate_tokens(message["content"]) + self.MESSAGE_OVERHEAD
+        try:
+            tokens = self.token_counter(message["content"])
+        except Exception as e:
+            print(f"[CONTEXT] Token count failed, estimating: {str(e)}")
+            tokens = self.estimate_tokens(message["content"])
+        tokens += self.MESSAGE_OVERHEAD
+        with self._cache_lock:
+            self._token_cache[key] = tokens
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return tokens
+
+    def _persona(self):
+        messages = self.chat_history.messages
+        if messages and messages[0]["role"] == "system":
+            return messages[0]
+        return None
+
+    def set_profile(self, profile):
+        with self._lock:
+            profile = profile or ""
+            if profile == self.profile:
+                return False
+            self.profile = profile
+            self.revision += 1
+            return True
+
+    def _prefix_message(self):
+        # Persona, profile and summary share one system message; the chat API
+        # doesn't accept two system prompts in a row
+        persona = self._persona()
+        parts = [persona["content"]] if persona else []
+        if self.profile:
+            parts.append(self.profile)
+        if self.summary:
+            parts.append(f"Summary of the conversation so far: {self.summary}")
+        if not parts:
+            return None
+        if len(parts) == 1 and persona:
+            return persona
+        return {"role": "system", "content": "\n\n".join(parts)}
+
+    def _first_index(self):
+        return 1 if self._persona() else 0
+
+    def _check_history(self):
+        # clear() or edits to old messages can leave window_start past the end
+        history = self.chat_history
+        if history.revision != self._history_revision:
+            self._history_revision = history.revision
+            if history.messages is not self._history_messages or self.window_start > len(history.messages):
+                self._history_messages = history.messages
+                self.window_start = self._first_index()
+                self.summary = ""
+                self.revision += 1
+        # A persona added to an empty history isn't part of the window
+        if self.window_start < self._first_index():
+            self.window_start = self._first_index()
+            self.revision += 1
+
+    def _fixed_tokens(self, exact=True):
+        prefix = self._prefix_message()
+        return self.count(prefix, exact) if prefix else 0
+
+    def _tail_tokens(self, tail_context):
+        # Estimated; this text changes every request
+        if not tail_context:
+            return 0
+        return self.estimate_tokens(tail_context) + self.MESSAGE_OVERHEAD
+
+    def prefix_tokens(self):
+        with self._lock:
+            return self._fixed_tokens(exact=False)
+
+    def prepare(self, tail_context=None):
+        # Returns (prefix messages, index of the first history message to
+        # send after them). Together with tail_context, sent after the
+        # history, everything fits max_prompt_tokens.
+        with self._lock:
+            self._check_history()
+            messages = self.chat_history.messages
+            prefix_message = self._prefix_message()
+            prefix = [prefix_message] if prefix_message else []
+            start = self.window_start
+
+            total = self._fixed_tokens(exact=False) + self._tail_tokens(tail_context) + sum(self.count(message, exact=False) for message in messages[start:])
+            trimmed = False
+            while start < len(messages) - 1 and (total > self.max_prompt_tokens or (trimmed and messages[start]["role"] != "user")):
+                total -= self.count(messages[start], exact=False)
+                start += 1
+                trimmed = True
+            if trimmed:
+                self.stats["trimmed_requests"] += 1
+            self.last_prompt_tokens = total
+            return prefix, start
+
+    def _choose_fold_end(self):
+        # Uses exact counts where the background thread has made them
+        messages = self.chat_history.messages
+        target = int(self.max_prompt_tokens * self.target_ratio)
+        total = self._fixed_tokens(exact=False) + sum(self.count(message, exact=False) for message in messages[self.window_start:])
+        if total <= self.max_prompt_tokens:
+            return None
+
+        fold_end = self.window_start
+        # Leave at least the latest exchange in the window
+        while total > target and fold_end < len(messages) - 2:
+            total -= self.count(messages[fold_end], exact=False)
+            fold_end += 1
+        # Start the window on a user turn so an exchange isn't split
+        while fold_end < len(messages) - 2 and messages[fold_end]["role"] != "user":
+            fold_end += 1
+        return fold_end if fold_end > self.window_start else None
+
+    def maybe_compact(self):
+        # Call after a turn. Starts the background thread that counts the
+        # turn's messages exactly and folds old turns into the summary
+        with self._lock:
+            self._check_history()
+            if self._summary_thread and self._summary_thread.is_alive():
+                return False
+            prefix = self._prefix_message()
+            pending = ([prefix] if prefix else []) + list(self.chat_history.messages[self.window_start:])
+            self._summary_thread = threading.Thread(
+                target=self._compact, args=(self.window_start, self._history_revision, pending))
+            self._summary_thread.daemon = True
+            self._summary_thread.start()
+            return True
+
+    def _compact(self, window_start, history_revision, pending):
+        for message in pending:
+            self.count(message)
+
+        with self._lock:
+            if window_start != self.window_start or history_revision != self.chat_history.revision:
+                # The history changed underneath; try again after the next turn
+                return
+            fold_end = self._choose_fold_end()
+            if fold_end is None:
+                return
+            if not self.summarizer:
+                self._fold(fold_end, self.summary)
+                return
+            folded = list(self.chat_history.messages[self.window_start:fold_end])
+            previous_summary = self.summary
+        self._summarize(window_start, fold_end, folded, previous_summary)
+
+    def _summarize(self, window_start, fold_end, folded, previous_summary):
+        try:
+            summary = self.summarizer(previous_summary, folded)
+        except Exception as e:
+            print(f"[CONTEXT] Summarization failed: {str(e)}")
+            self.stats["summary_failures"] += 1
+            return
+
+        with self._lock:
+            if window_start != self.window_start or self.chat_history.revision != self._history_revision:
+                # The history changed underneath; try again after the next turn
+                return
+            self._fold(fold_end, summary.strip() if summary else previous_summary)
+            self.stats["summaries"] += 1
+        print(f"[CONTEXT] Folded {len(folded)} messages into the summary ({self.estimate_tokens(self.summary)} tokens)")
+
+    def _fold(self, fold_end, summary):
+        messages = self.chat_history.messages
+        with self._cache_lock:
+            for message in messages[self.window_start:fold_end]:
+                self._token_cache.pop((message["role"], message["content"]), None)
+        self.stats["folded_messages"] += fold_end - self.window_start
+        self.window_start = fold_end
+        self.summary = summary
+        self.revision += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["window_start"] = self.window_start
+        stats["window_messages"] = len(self.chat_history.messages) - self.window_start
+        stats["summary_tokens"] = self.estimate_tokens(self.summary) if self.summary else 0
+        stats["last_prompt_tokens"] = self.last_prompt_tokens
+        return stats
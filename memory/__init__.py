@@ -1,2 +1,3 @@
 from .memory_manager import MemoryManager
-from .storage import MemoryStorage
\ No newline at end of file
+from .storage import MemoryStorage
+from .prefetch import MemoryPrefetcher
\ No newline at end of file
@@ -103,37 +103,45 @@ class MemoryManager:
             })"""
 
     def get_memory_context(self, user_id, recent_message, limit=3):
-        # Get memories relevant to the current conversation topic
-        relevant_memories = self.get_relevant_memories(user_id, recent_message, limit)
+        # Profile and relevant memories together, as one block of context
+        parts = [self.get_profile_context(user_id), self.get_retrieved_context(user_id, recent_message, limit)]
+        parts = [part for part in parts if part]
+        return "\n".join(parts) if parts else None
+
+    def get_profile_context(self, user_id):
+        # Changes only when the profile does; sorted so the text is the same
+        # from one request to the next
+        if not self.profile_manager:
+            return None
+        profile_context = self.profile_manager.get_profile_summary(user_id)
+        if not profile_context:
+            return None
         
-        # Get relevant user profile information
-        profile_context = None
-        if self.profile_manager:
-            profile_context = self.profile_manager.get_profile_summary(user_id)
+        context_parts = ["I know the following about this user:"]
+        for category in sorted(profile_context):
+            items = profile_context[category]
+            if items:
+                likes = sorted(item for item in items if not item.startswith("doesn't like"))
+                dislikes = sorted(item.replace("doesn't like ", "") for item in items if item.startswith("doesn't like"))
+                
+                if likes:
+                    context_parts.append(f"- User likes {category}: {', '.join(likes)}")
+                if dislikes:
+                    context_parts.append(f"- User dislikes {category}: {', '.join(dislikes)}")
         
-        if not relevant_memories and not profile_context:
+        return "\n".join(context_parts) if len(context_parts) > 1 else None
+
+    def get_retrieved_context(self, user_id, recent_message, limit=3):
+        # Get memories relevant to the current conversation topic
+        relevant_memories = self.get_relevant_memories(user_id, recent_message, limit)
+        if not relevant_memories:
             return None
         
         # Format the memories as context for the AI
         context_parts = ["I recall the following about this user:"]
-        
-        # Add profile information
-        if profile_context:
-            for category, items in profile_context.items():
-                if items:
-                    likes = [item for item in items if not item.startswith("doesn't like")]
-                    dislikes = [item.replace("doesn't like ", "") for item in items if item.startswith("doesn't like")]
-                    
-                    if likes:
-                        context_parts.append(f"- User likes {category}: {', '.join(likes)}")
-                    if dislikes:
-                        context_parts.append(f"- User dislikes {category}: {', '.join(dislikes)}")
-        
-        # Add memories
         for memory in relevant_memories:
             memory_type = memory.get('type', 'unknown')
             content = memory.get('content', '')
-            timestamp = memory.get('timestamp', '')
             
             # Format based on memory type
             if memory_type == 'preference':
@@ -0,0 +1,128 @@
+import difflib
+import re
+import threading
+import time
+
+class MemoryPrefetcher:
+    """Runs memory retrieval on interim transcripts while the user is still
+    talking, so it is usually done by the time the final transcript arrives.
+
+    on_interim_result() hands the newest interim text to a background
+    thread; only the latest query is kept, so a burst of interims costs at
+    most one search in flight and one waiting. get_retrieved_context() is a
+    drop-in for MemoryManager.get_retrieved_context: if the final text is
+    within min_similarity of the last speculative query (word-level
+    SequenceMatcher ratio), it returns that result, waiting for it if the
+    search is still running. Otherwise it searches as before."""
+
+    def __init__(self, memory_manager, user_id="default_user", limit=3, min_words=3, min_similarity=0.8, max_age=10.0):
+        self.memory_manager = memory_manager
+        self.user_id = user_id
+        self.limit = limit
+        self.min_words = min_words
+        self.min_similarity = min_similarity
+        # Candidates older than this are from an earlier utterance
+        self.max_age = max_age
+
+        self._condition = threading.Condition()
+        self._pending = None
+        self._running = None
+        # (user id, words, context, finished at, search seconds) of the latest search
+        self._candidate = None
+        self._stop_requested = False
+        self._worker_thread = None
+        self.stats = {"prefetches": 0, "hits": 0, "waits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def start(self):
+        if self._worker_thread is None or not self._worker_thread.is_alive():
+            self._stop_requested = False
+            self._worker_thread = threading.Thread(target=self._run)
+            self._worker_thread.daemon = True
+            self._worker_thread.start()
+
+    def set_user_id(self, user_id):
+        # Speculative results for the previous user are useless now
+        with self._condition:
+            self.user_id = user_id
+            self._pending = None
+            self._candidate = None
+
+    @staticmethod
+    def _words(text):
+        return tuple(re.findall(r"[\w']+", text.lower()))
+
+    def _similarity(self, a, b):
+        return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+    def on_interim_result(self, text):
+        # Called from the STT thread; only queues the text
+        words = self._words(text)
+        if len(words) < self.min_words:
+            return
+        with self._condition:
+            if words in (self._pending, self._running) or (self._candidate and self._candidate[1] == words):
+                return
+            self._pending = words
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stop_requested:
+                    self._condition.wait()
+                if self._stop_requested:
+                    return
+                words = self._running = self._pending
+                user_id = self.user_id
+                self._pending = None
+
+            started = time.time()
+            try:
+                context = self.memory_manager.get_retrieved_context(user_id, " ".join(words), self.limit)
+            except Exception as e:
+                print(f"[MEMORY] Prefetch failed: {str(e)}")
+                context = None
+                words = None
+            elapsed = time.time() - started
+
+            with self._condition:
+                if words is not None:
+                    self._candidate = (user_id, words, context, time.time(), elapsed)
+                    self.stats["prefetches"] += 1
+                self._running = None
+                self._condition.notify_all()
+
+    def get_retrieved_context(self, user_id, recent_message, limit=3):
+        if self._worker_thread is None or not self._worker_thread.is_alive():
+            return self.memory_manager.get_retrieved_context(user_id, recent_message, limit)
+        words = self._words(recent_message or "")
+        started = time.time()
+        if user_id == self.user_id and limit == self.limit and words:
+            with self._condition:
+                # A search for close enough text is still running; it will
+                # finish sooner than a new one
+                if self._running is not None and self._similarity(self._running, words) >= self.min_similarity:
+                    self.stats["waits"] += 1
+                    while self._running is not None:
+                        self._condition.wait()
+                candidate = self._candidate
+                self._candidate = None
+                self._pending = None
+            if (candidate and candidate[0] == user_id and time.time() - candidate[3] <= self.max_age
+                    and self._similarity(candidate[1], words) >= self.min_similarity):
+                self.stats["hits"] += 1
+                self.stats["saved_seconds"] += max(0.0, candidate[4] - (time.time() - started))
+                return candidate[2]
+
+        self.stats["misses"] += 1
+        return self.memory_manager.get_retrieved_context(user_id, recent_message, limit)
+
+    def stop(self):
+        with self._condition:
+            self._stop_requested = True
+            self._condition.notify_all()
+        if self._worker_thread and self._worker_thread.is_alive():
+            self._worker_thread.join(timeout=2.0)
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -0,0 +1,76 @@
+class PromptAssembler:
+    """Lays out each request so the server's prefix (KV) cache can reuse it.
+
+    Everything that stays the same from one request to the next comes first
+    and is never rewritten: the persona with the user profile and the running
+    summary, then the conversation, which only grows at the end. Retrieved
+    memories change every turn, so they go last, after the newest user
+    message, where they only cost the tokens they add.
+
+    The profile is refreshed only when the prefix is changing anyway (the
+    context window folded old turns into the summary) or on the first
+    request. Preferences learned in between are still in the conversation
+    itself, so nothing is lost by waiting.
+
+    Prefix reuse is measured against the previous request: the persona
+    message plus the history messages both share, in tokens."""
+
+    def __init__(self, context_window):
+        self.context = context_window
+        self._pending_profile = None
+        self._profile_revision = None
+        # (history revision, context revision, start, end) of the last request
+        self._previous = None
+        self.last_reuse_ratio = 0.0
+        self.stats = {"requests": 0, "prompt_tokens": 0, "reused_tokens": 0, "prefix_breaks": 0, "profile_refreshes": 0}
+
+    def profile_due(self):
+        # True when a new profile would be applied on the next request; the
+        # profile lookup can be skipped otherwise
+        return self._profile_revision is None or self._profile_revision != self.context.revision
+
+    def update_profile(self, profile):
+        # Held back until it can be applied without breaking the cached prefix
+        self._pending_profile = profile or ""
+
+    def _apply_profile(self):
+        if self._pending_profile is None or not self.profile_due():
+            return
+        if self.context.set_profile(self._pending_profile):
+            self.stats["profile_refreshes"] += 1
+        self._pending_profile = None
+        self._profile_revision = self.context.revision
+
+    def assemble(self, tail_context=None):
+        # Returns (prefix messages, start, tail message or None); the request
+        # is prefix + history.messages[start:] + [tail]
+        self._apply_profile()
+        prefix, start = self.context.prepare(tail_context)
+        tail = {"role": "system", "content": tail_context} if tail_context else None
+        self._measure(start)
+        return prefix, start, tail
+
+    def _measure(self, start):
+        history = self.context.chat_history
+        messages = history.messages
+        current = (history.revision, self.context.revision, start, len(messages))
+        prompt_tokens = self.context.last_prompt_tokens
+
+        reused = 0
+        previous = self._previous
+        if previous and previous[:3] == current[:3] and previous[3] <= len(messages):
+            reused = self.context.prefix_tokens() + sum(self.context.count(message, exact=False) for message in messages[start:previous[3]])
+        elif previous:
+            self.stats["prefix_breaks"] += 1
+        self._previous = current
+
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["reused_tokens"] += reused
+        self.last_reuse_ratio = reused / prompt_tokens if prompt_tokens else 0.0
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["last_reuse_ratio"] = self.last_reuse_ratio
+        stats["reuse_ratio"] = stats["reused_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        return stats
@@ -40,6 +40,13 @@ class ConversationPrompter:
         self.timer_active = False
         print("\n⏸️ Timer STOPPED - Valid transcription received")
     
+    def on_turn_interrupted(self):
+        # The cut-off reply never finishes playing, so on_tts_finished won't
+        # come for it; the timer restarts after the reply to the interruption
+        self.timer_active = False
+        self.last_interaction_time = time.time()
+        print("\n⏸️ Timer STOPPED - Bunny was interrupted")
+    
     def start(self):
         if self.is_running:
             print("Prompter already running")
@@ -1,11 +1,11 @@
 import numpy as np
-import sounddevice as sd
 from faster_whisper import WhisperModel
 import webrtcvad
 import queue
+import collections
 import threading
-import struct
 import time
+from stt_pipeline import IncrementalTranscriber, AudioBuffer, TranscriptionWorker, TranscriptionJob, Endpointer, MicrophoneSource, InterimScheduler, SharedDecoder, EchoCanceller
 
 class SpeechToText:
     def __init__(self,
@@ -18,14 +18,48 @@ class SpeechToText:
                  frame_duration_ms=30,
                  padding_duration_ms=300,
                  language="en",
-                 prompter=None
+                 prompter=None,
+                 incremental_streaming=True,
+                 streaming_window=5.0,
+                 max_utterance_seconds=30.0,
+                 max_audio_queue_frames=500,
+                 confidence_filter=False,
+                 confidence_threshold=0.6,
+                 final_beam_size=5,
+                 final_word_timestamps=False,
+                 interim_model_size=None,
+                 interim_device="cpu",
+                 interim_compute_type="int8",
+                 interim_beam_size=1,
+                 early_hangover=0.3,
+                 interim_cpu_budget=0.5,
+                 model=None,
+                 interim_model=None,
+                 decoder=None,
+                 source_id="mic",
+                 source=None,
+                 priority=0,
+                 echo_reference=None,
+                 echo_tail_ms=300
                  ):
-        self.model = WhisperModel(
-            model_size, 
-            device=device, 
-            compute_type=compute_type,
-            local_files_only=False
-        )
+        # model/interim_model/decoder let several SpeechToText instances share
+        # one set of loaded models and one decode thread (see MultiSourceSpeechToText)
+        self.model = model or self.load_model(model_size, device, compute_type)
+        
+        # Optional second, smaller model for interim captions only; the main
+        # model is kept for the committed final text
+        if interim_model:
+            self.interim_model = interim_model
+        elif interim_model_size and (interim_model_size, interim_device, interim_compute_type) != (model_size, device, compute_type):
+            self.interim_model = self.load_model(interim_model_size, interim_device, interim_compute_type)
+        else:
+            self.interim_model = self.model
+        self.final_beam_size = final_beam_size
+        # Word alignment adds decode time to every final; the confidence gate
+        # only needs segment scores, so it is off unless a caller wants the
+        # words in last_final_segments
+        self.final_word_timestamps = final_word_timestamps
+        self.interim_beam_size = interim_beam_size
         
         self.sample_rate = 16000
         self.vad_frame_ms = 30
@@ -35,10 +69,20 @@ class SpeechToText:
         if prompter:
             self.set_prompter(prompter)
         
-        self.audio_queue = queue.Queue()
+        # Bounded so a stalled consumer drops (and counts) frames instead of
+        # growing without limit
+        self.audio_queue = queue.Queue(maxsize=max_audio_queue_frames)
+        self.dropped_frames = 0
+        self._pcm_float = None
+        self._pcm_int16 = None
+        self._batch_float = None
+        self._batch_int16 = None
         
         self.is_speaking = False
-        self.speech_buffer = []
+        # Utterance audio lives in one preallocated buffer; reaching the cap
+        # finalizes the utterance instead of growing it
+        self.max_utterance_seconds = max_utterance_seconds
+        self.speech_buffer = AudioBuffer(int(max_utterance_seconds * self.sample_rate))
         self.silence_frames = 0
         self.current_transcript = ""
         self.last_update_time = 0
@@ -46,22 +90,95 @@ class SpeechToText:
         self.silence_threshold = silence_threshold
         self.frame_duration_ms = frame_duration_ms
         self.padding_duration_ms = padding_duration_ms
+        
+        # Adaptive amplitude gate and hangover; silence_threshold is the full
+        # hangover, early_hangover applies once the interim text looks finished
+        self.endpointer = Endpointer(
+            frame_ms=self.vad_frame_ms,
+            hangover_seconds=silence_threshold,
+            early_hangover_seconds=early_hangover
+        )
+        # Pre-roll so the first syllable isn't clipped by the VAD decision
+        self.padding_frames = collections.deque(maxlen=max(1, padding_duration_ms // self.vad_frame_ms))
+        self._last_interim_samples = 0
+        self.confidence_filter = confidence_filter
+        self.confidence_threshold = confidence_threshold
+        self.last_final_segments = []
+
+        # Interim cadence and decode window adapt to measured decode time;
+        # streaming_interval and streaming_window are the fast-path values
+        self.interim_scheduler = InterimScheduler(
+            base_interval=streaming_interval,
+            cpu_budget=interim_cpu_budget,
+            max_window=streaming_window,
+            min_window=min(2.0, streaming_window)
+        )
+
+        # Interim passes only decode the unsettled tail of the utterance
+        self.incremental_streaming = incremental_streaming
+        self.incremental_transcriber = IncrementalTranscriber(
+            self.interim_model,
+            language=self.language,
+            sample_rate=self.sample_rate,
+            window_seconds=streaming_window,
+            beam_size=interim_beam_size
+        )
+        self._utterance_id = 0
+        self._interim_utterance_id = None
+
+        # Whisper decodes run on their own thread so VAD and endpointing never
+        # wait on the model
+        self.source_id = source_id
+        if decoder:
+            self.transcription_worker = decoder.register(
+                source_id, self._handle_transcription_job, self._emit_final, priority=priority)
+        else:
+            self.transcription_worker = TranscriptionWorker(self._handle_transcription_job)
 
         self.tts_playback_buffer = []
         self.is_tts_playing = False
         
+        # With an EchoReference fed by the TTS player, Bunny's voice is
+        # subtracted from the mic and speech during playback is handled
+        # immediately instead of being held until the clip ends
+        self.echo_reference = echo_reference
+        self.echo_canceller = None
+        if echo_reference is not None:
+            self.echo_canceller = EchoCanceller(
+                block_size=int(self.vad_frame_ms * self.sample_rate / 1000),
+                sample_rate=self.sample_rate,
+                tail_ms=echo_tail_ms
+            )
+        
         self.is_running = False
         self.processing_thread = None
-        self.stream = None
+        self.input_source = source
+        self.source = None
+        self._last_speech_time = 0
         
         self.on_interim_result = None
         self.on_final_result = None
+        # Called as (source_id, text) alongside on_final_result
+        self.on_source_final_result = None
+
+    @staticmethod
+    def load_model(model_size, device, compute_type):
+        print(f"Loading Whisper model '{model_size}' on {device} ({compute_type})")
+        return WhisperModel(
+            model_size, 
+            device=device, 
+            compute_type=compute_type,
+            local_files_only=False
+        )
 
     # In stt_module.py
     def on_tts_started(self):
         self.is_tts_playing = True
         self.tts_playback_buffer = []  # Clear buffer when TTS starts
-        print("DEBUG: TTS playback started, buffering enabled")
+        if self.echo_canceller:
+            print("DEBUG: TTS playback started, echo cancellation active")
+        else:
+            print("DEBUG: TTS playback started, buffering enabled")
         
     def on_tts_finished(self):
         self.is_tts_playing = False
@@ -78,46 +195,109 @@ class SpeechToText:
                 
             self.tts_playback_buffer = []  # Clear buffer after processing
 
+    def frame_to_pcm(self, frame):
+        # Vectorized float -> int16 conversion into preallocated scratch buffers.
+        # Frames that already arrive as int16 are handed to webrtcvad as-is.
+        # Returns a byte view rather than a copy; it is only valid until the
+        # next call. webrtcvad takes any buffer but sizes it with len(), so
+        # the view is cast to bytes.
+        if frame.dtype == np.int16:
+            return memoryview(np.ascontiguousarray(frame)).cast("B")
+        
+        if self._pcm_float is None or len(self._pcm_float) != len(frame):
+            self._pcm_float = np.empty(len(frame), dtype=np.float32)
+            self._pcm_int16 = np.empty(len(frame), dtype=np.int16)
+        
+        np.clip(frame, -1.0, 32767 / 32768, out=self._pcm_float)
+        np.multiply(self._pcm_float, 32768, out=self._pcm_int16, casting="unsafe")
+        return memoryview(self._pcm_int16).cast("B")
+
+    def frame_amplitude(self, frame):
+        # Peak level in float units (full scale = 1.0) for either frame type.
+        # The extremes are taken as Python numbers first, since negating
+        # int16 -32768 overflows.
+        peak = max(float(frame.max()), -float(frame.min()))
+        return peak / 32768 if frame.dtype == np.int16 else peak
+
     def is_speech(self, frame):
-        amplitude = np.max(np.abs(frame))
-        if amplitude < 0.03:
+        if self.frame_amplitude(frame) < self.endpointer.speech_gate():
             return False
             
-        pcm = struct.pack("h" * len(frame), 
-                         *[int(s * 32768) for s in frame])
+        pcm = self.frame_to_pcm(frame)
         return self.vad.is_speech(pcm, self.sample_rate)
-    
-    def filter_transcripts_by_confidence(self, text, audio_duration, confidence_threshold=0.6, max_chunk_duration=10.0):
-        print("\n==== ENTERING filter_transcripts_by_confidence ====\n")
+
+    def is_speech_batch(self, frames):
+        # Scores a backlog of equally sized frames in one pass: the frames are
+        # converted once into a preallocated int16 block, and webrtcvad reads
+        # each frame straight out of it.
+        if not frames:
+            return []
+        
+        frame_length = len(frames[0])
+        dtype = frames[0].dtype
+        if any(len(frame) != frame_length or frame.dtype != dtype for frame in frames):
+            return [self.is_speech(frame) for frame in frames]
+        
+        count = len(frames)
+        if self._batch_int16 is None or self._batch_int16.shape[0] < count or self._batch_int16.shape[1] != frame_length:
+            self._batch_float = np.empty((count, frame_length), dtype=np.float32)
+            self._batch_int16 = np.empty((count, frame_length), dtype=np.int16)
+        pcm_block = self._batch_int16[:count]
         
+        if dtype == np.int16:
+            for i, frame in enumerate(frames):
+                pcm_block[i] = frame
+            amplitudes = np.maximum(pcm_block.max(axis=1).astype(np.float32), -pcm_block.min(axis=1).astype(np.float32)) / 32768
+        else:
+            block = self._batch_float[:count]
+            for i, frame in enumerate(frames):
+                block[i] = frame
+            amplitudes = np.maximum(block.max(axis=1), -block.min(axis=1))
+            np.clip(block, -1.0, 32767 / 32768, out=block)
+            np.multiply(block, 32768, out=pcm_block, casting="unsafe")
+        pcm = memoryview(pcm_block).cast("B")
+        
+        frame_bytes = frame_length * 2
+        gate = self.endpointer.speech_gate()
+        results = []
+        for i, amplitude in enumerate(amplitudes):
+            if amplitude < gate:
+                results.append(False)
+            else:
+                results.append(self.vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], self.sample_rate))
+        return results
+
+    def _drain_audio_queue(self, max_frames=100):
+        frames = []
+        while len(frames) < max_frames:
+            try:
+                frames.append(self.audio_queue.get_nowait())
+            except queue.Empty:
+                break
+        if self.echo_canceller:
+            frames = [self.echo_canceller.process(frame, reference) for frame, reference in frames]
+        return frames
+    
+    def filter_transcripts_by_confidence(self, text, audio_duration, segments, confidence_threshold=0.6, max_chunk_duration=10.0, time_offset=0.0):
+        # Scores the segments the final pass already produced, so the gate
+        # costs no extra decode
         if audio_duration < 0.75:
             required_confidence = max(0.8, confidence_threshold)
         else:
             required_confidence = confidence_threshold
         
-        audio_data = self.speech_buffer_to_audio()
-        
-        samples_per_second = self.sample_rate
-        max_samples = int(max_chunk_duration * samples_per_second)
-        
-        if len(audio_data) > max_samples:
-            print(f"Audio too long ({len(audio_data)/samples_per_second:.2f}s), processing only last {max_chunk_duration}s")
-            audio_data = audio_data[-max_samples:]
-        
-        segments = self.model.transcribe(
-            audio_data,
-            beam_size=2,
-            language=self.language,
-            vad_filter=False,
-            word_timestamps=True
-        )
-        
-        segments_list = list(segments)
-        if not segments_list:
+        if not segments:
             print("No segments found in transcription")
             return ""
         
-        avg_confidence = sum(segment.avg_logprob for segment in segments_list) / len(segments_list)
+        # Only judge the most recent max_chunk_duration seconds of long utterances
+        if audio_duration > max_chunk_duration:
+            cutoff = audio_duration - max_chunk_duration
+            recent_segments = [segment for segment in segments if segment.end - time_offset > cutoff]
+            if recent_segments:
+                segments = recent_segments
+        
+        avg_confidence = sum(segment.avg_logprob for segment in segments) / len(segments)
         normalized_confidence = min(1.0, max(0.0, (avg_confidence + 4) / 4))  # Normalize from log prob
         
         print(f"\nDEBUG: Transcript confidence: {normalized_confidence:.2f} - '{text}'\n")
@@ -129,9 +309,7 @@ class SpeechToText:
             return ""
     
     def speech_buffer_to_audio(self):
-        if not self.speech_buffer:
-            return np.array([])
-        return np.concatenate(self.speech_buffer)
+        return self.speech_buffer.view()
 
     def default_display(self, text, is_final=False):
         if is_final:
@@ -142,81 +320,15 @@ class SpeechToText:
         
         try:
             while self.is_running:
-                if not self.audio_queue.empty():
-                    chunk = self.audio_queue.get()
-                    
-                    has_speech = self.is_speech(chunk)
-                    
-                    if has_speech:
-                        if not self.is_speaking:
-                            self.is_speaking = True
-                            print("\nSpeech detected...")
-                            self.last_update_time = time.time()
-                            if hasattr(self, 'on_voice_activity_started') and self.on_voice_activity_started:
-                                self.on_voice_activity_started()
-                        
-                        self.silence_frames = 0
-                        self.speech_buffer.append(chunk)
-                        
-                        current_time = time.time()
-                        buffer_duration = len(self.speech_buffer) * (self.vad_frame_ms / 1000)
-                        
-                        if current_time - self.last_update_time >= self.streaming_interval and buffer_duration >= 0.6:
-                            audio_data = np.concatenate(self.speech_buffer)
-                            
-                            segments, _ = self.model.transcribe(
-                                audio_data, 
-                                beam_size=5,
-                                language=self.language,
-                                vad_filter=False
-                            )
-                            
-                            interim_text = "".join(segment.text for segment in segments).strip()
-                            
-                            # Fixed condition: Check if text is valid
-                            if interim_text and "ლლლ" not in interim_text:
-                                if self.on_interim_result:
-                                    self.on_interim_result(interim_text)
-                                else:
-                                    self.default_display(interim_text)
-                                
-                            self.last_update_time = current_time
-                            
-                    else:
-                        if self.is_speaking:
-                            self.silence_frames += 1
-                            
-                            if self.silence_frames >= 50:
-                                self.is_speaking = False
-                                
-                                if len(self.speech_buffer) > 0:
-                                    audio_data = np.concatenate(self.speech_buffer)
-                                    
-                                    segments, _ = self.model.transcribe(
-                                        audio_data,
-                                        beam_size=5,
-                                        language=self.language
-                                    )
-                                    
-                                    final_text = "".join(segment.text for segment in segments).strip()
-                                    
-                                    # Fixed condition: Check if text is valid
-                                    if final_text and "ლლლ" not in final_text:
-                                        # NEW CODE: Buffer transcription if TTS is playing
-                                        if hasattr(self, 'is_tts_playing') and self.is_tts_playing:
-                                            print(f"TTS is playing, buffering transcription: {final_text}")
-                                            self.tts_playback_buffer.append(final_text)
-                                        else:
-                                            # Process normally if TTS is not playing
-                                            if self.on_final_result:
-                                                self.on_final_result(final_text)
-                                            else:
-                                                self.default_display(final_text, is_final=True)
-                                
-                                self.speech_buffer = []
-                                
-                                if hasattr(self, 'on_voice_activity_ended') and self.on_voice_activity_ended:
-                                    self.on_voice_activity_ended()
+                frames = self._drain_audio_queue()
+                
+                if len(frames) > 1:
+                    decisions = self.is_speech_batch(frames)
+                else:
+                    decisions = [self.is_speech(frame) for frame in frames]
+                
+                for chunk, has_speech in zip(frames, decisions):
+                    self.process_frame(chunk, has_speech)
                 
                 time.sleep(0.01)
                 
@@ -226,35 +338,222 @@ class SpeechToText:
             self.is_tts_playing = False
             self.tts_playback_buffer = []
 
+    def process_frame(self, chunk, has_speech):
+        if has_speech:
+            if self.is_speaking and self.speech_buffer.free_samples < len(chunk):
+                print(f"Utterance reached {self.max_utterance_seconds:.0f}s cap, finalizing")
+                self._finalize_utterance()
+            
+            if not self.is_speaking:
+                self.is_speaking = True
+                self._utterance_id += 1
+                self._last_interim_samples = 0
+                self.endpointer.reset()
+                print("\nSpeech detected...")
+                self.last_update_time = time.time()
+                for padding in self.padding_frames:
+                    self.speech_buffer.append(padding)
+                self.padding_frames.clear()
+                if hasattr(self, 'on_voice_activity_started') and self.on_voice_activity_started:
+                    self.on_voice_activity_started()
+            
+            self.silence_frames = 0
+            self._last_speech_time = time.time()
+            self.speech_buffer.append(chunk)
+            
+            current_time = time.time()
+            buffer_duration = self.speech_buffer.duration(self.sample_rate)
+            
+            if self.interim_scheduler.should_run(current_time, self.last_update_time, buffer_duration,
+                                                 worker_idle=self.transcription_worker.is_idle()):
+                self._run_interim_pass()
+                self.last_update_time = current_time
+                
+        else:
+            self.endpointer.update_noise_floor(self.frame_amplitude(chunk))
+            
+            if self.is_speaking:
+                self.silence_frames += 1
+                
+                # One interim pass over everything said so far, so the
+                # endpointer can judge whether the sentence is finished
+                if self.silence_frames == 1 and self._last_interim_samples < len(self.speech_buffer):
+                    self._run_interim_pass()
+                
+                if self.endpointer.should_end(self.silence_frames, len(self.speech_buffer)):
+                    self._finalize_utterance()
+            else:
+                self.padding_frames.append(chunk)
+
+    def _run_interim_pass(self):
+        # The buffer is overwritten by the next utterance while the worker may
+        # still be decoding, so the job gets its own copy; a stale job from an
+        # utterance that already ended is discarded by the worker. The
+        # incremental transcriber never decodes committed audio again, so
+        # only the part after it (at most one window) is copied
+        total = len(self.speech_buffer)
+        self._last_interim_samples = total
+        offset = 0
+        if self.incremental_streaming:
+            transcriber = self.incremental_transcriber
+            if self._interim_utterance_id == self._utterance_id:
+                offset = transcriber.committed_samples
+            offset = min(total, max(offset, total - int(transcriber.window_seconds * self.sample_rate)))
+        self.transcription_worker.submit(TranscriptionJob(
+            TranscriptionJob.INTERIM, self._utterance_id, self.speech_buffer.view()[offset:].copy(), offset=offset))
+
+    def _finalize_utterance(self):
+        self.is_speaking = False
+        
+        if len(self.speech_buffer) > 0:
+            # The buffer is reused by the next utterance, so the final job
+            # gets its own copy
+            self.transcription_worker.submit(TranscriptionJob(
+                TranscriptionJob.FINAL, self._utterance_id, self.speech_buffer.view().copy(),
+                speech_ended_at=self._last_speech_time))
+        
+        self.speech_buffer.clear()
+        
+        if hasattr(self, 'on_voice_activity_ended') and self.on_voice_activity_ended:
+            self.on_voice_activity_ended()
+
+    def _handle_transcription_job(self, job):
+        if job.kind == TranscriptionJob.INTERIM:
+            self._transcribe_interim(job)
+        else:
+            self._transcribe_final(job)
+
+    def _transcribe_interim(self, job):
+        if job.utterance_id != self._utterance_id or not self.is_speaking:
+            return
+        
+        if self._interim_utterance_id != job.utterance_id:
+            self.incremental_transcriber.reset()
+            self._interim_utterance_id = job.utterance_id
+        
+        started = time.time()
+        if self.incremental_streaming:
+            interim_text = self.incremental_transcriber.update(job.audio, job.offset)
+            decoded_samples = self.incremental_transcriber.last_decoded_samples
+        else:
+            segments, _ = self.interim_model.transcribe(
+                job.audio, 
+                beam_size=self.interim_beam_size,
+                language=self.language,
+                vad_filter=False
+            )
+            
+            interim_text = "".join(segment.text for segment in segments).strip()
+            decoded_samples = len(job.audio)
+        
+        self.interim_scheduler.record(time.time() - started, decoded_samples / self.sample_rate)
+        self.incremental_transcriber.window_seconds = self.interim_scheduler.window_seconds
+        
+        if job.utterance_id == self._utterance_id:
+            self.endpointer.on_interim(interim_text, job.offset + len(job.audio))
+        
+        # Fixed condition: Check if text is valid
+        if interim_text and "ლლლ" not in interim_text:
+            if self.on_interim_result:
+                self.on_interim_result(interim_text)
+            else:
+                self.default_display(interim_text)
+
+    def _transcribe_final(self, job):
+        segments, _ = self.model.transcribe(
+            job.audio,
+            beam_size=self.final_beam_size,
+            language=self.language,
+            word_timestamps=self.final_word_timestamps
+        )
+        self._emit_final(job, segments)
+
+    def _emit_final(self, job, segments, time_offset=0.0):
+        # time_offset is where this utterance starts in the decoded audio; it
+        # is non-zero when the shared decoder batched several utterances
+        if self._interim_utterance_id == job.utterance_id:
+            self.incremental_transcriber.reset()
+            self._interim_utterance_id = None
+        
+        # Keep the decoded segments (avg_logprob, timings) around so the
+        # confidence gate and callers can read them without decoding again
+        segments = list(segments)
+        self.last_final_segments = segments
+        final_text = "".join(segment.text for segment in segments).strip()
+        
+        if final_text and self.confidence_filter:
+            audio_duration = len(job.audio) / self.sample_rate
+            final_text = self.filter_transcripts_by_confidence(
+                final_text, audio_duration, segments,
+                confidence_threshold=self.confidence_threshold,
+                time_offset=time_offset
+            )
+        
+        # Fixed condition: Check if text is valid
+        if final_text and "ლლლ" not in final_text:
+            # NEW CODE: Buffer transcription if TTS is playing
+            if self.is_tts_playing and not self.echo_canceller:
+                print(f"TTS is playing, buffering transcription: {final_text}")
+                self.tts_playback_buffer.append(final_text)
+            else:
+                # Process normally if TTS is not playing
+                if self.on_source_final_result:
+                    self.on_source_final_result(self.source_id, final_text)
+                if self.on_final_result:
+                    self.on_final_result(final_text)
+                elif not self.on_source_final_result:
+                    self.default_display(final_text, is_final=True)
+
+    def get_pipeline_stats(self):
+        stats = dict(self.transcription_worker.stats)
+        stats["audio_queue_depth"] = self.audio_queue.qsize()
+        stats["transcription_queue_depth"] = self.transcription_worker.queue_depth()
+        if self.echo_canceller:
+            stats["echo"] = dict(self.echo_canceller.stats)
+        stats["dropped_frames"] = self.dropped_frames
+        stats.update(self.interim_scheduler.get_stats())
+        return stats
+
     def audio_callback(self, indata, frames, time, status):
         if status:
             print(f"Status: {status}")
         
-        self.audio_queue.put(indata[:, 0].copy())
+        self.enqueue_frame(indata[:, 0].copy())
 
-    def start(self):
+    def enqueue_frame(self, frame):
+        if self.echo_reference is not None:
+            # Paired at capture time so queueing delay can't misalign them
+            frame = (frame, self.echo_reference.pull(len(frame)))
+        try:
+            self.audio_queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def start(self, source=None):
         if self.is_running:
             print("Already running")
             return
         
         self.is_running = True
+        self.transcription_worker.start()
+        if self.echo_canceller:
+            self.echo_canceller.reset()
+            self.echo_reference.clear()
         
         self.processing_thread = threading.Thread(target=self.process_audio_queue)
         self.processing_thread.daemon = True
         self.processing_thread.start()
         
-        self.stream = sd.InputStream(
-            callback=self.audio_callback,
-            channels=1,
-            samplerate=self.sample_rate,
+        # Any AudioSource works here (file, pipe, synthetic); default is the mic
+        self.source = source or self.input_source or MicrophoneSource(
+            sample_rate=self.sample_rate,
             blocksize=int(self.vad_frame_ms * self.sample_rate / 1000)
         )
-        self.stream.start()
+        self.source.start(self.enqueue_frame)
         
         print("Transcription started")
 
     def stop(self):
-        self.is_running = False
         self.is_tts_playing = False  # Reset TTS state
         self.tts_playback_buffer = []  # Clear buffer
         
@@ -264,11 +563,100 @@ class SpeechToText:
         
         self.is_running = False
         
-        if self.stream:
-            self.stream.close()
-            self.stream = None
+        if self.source:
+            self.source.stop()
+            self.source = None
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2)
         
-        print("Transcription stopped")
\ No newline at end of file
+        self.transcription_worker.stop()
+        self.transcription_worker.clear()
+        
+        print("Transcription stopped")
+
+class MultiSourceSpeechToText:
+    """Transcribes several audio sources with one set of Whisper models.
+
+    Each source gets its own SpeechToText (VAD, endpointing, buffers) and all
+    of them share a SharedDecoder, so a second input such as a co-host routed
+    to a virtual device doesn't load a second model. Finals are reported
+    through on_final_result(source_id, text).
+
+    sources maps a source id to an AudioSource, or to a dict with "source"
+    and optional "priority" (higher is served first)."""
+
+    def __init__(self,
+                 sources,
+                 model_size="small",
+                 device="cuda",
+                 compute_type="float16",
+                 interim_model_size=None,
+                 interim_device="cpu",
+                 interim_compute_type="int8",
+                 language="en",
+                 final_beam_size=5,
+                 final_word_timestamps=False,
+                 batch_size=4,
+                 **stt_options):
+        self.model = SpeechToText.load_model(model_size, device, compute_type)
+        if interim_model_size and (interim_model_size, interim_device, interim_compute_type) != (model_size, device, compute_type):
+            self.interim_model = SpeechToText.load_model(interim_model_size, interim_device, interim_compute_type)
+        else:
+            self.interim_model = self.model
+        
+        self.decoder = SharedDecoder(
+            self.model,
+            language=language,
+            final_beam_size=final_beam_size,
+            batch_size=batch_size,
+            word_timestamps=final_word_timestamps
+        )
+        
+        self.streams = {}
+        for source_id, config in sources.items():
+            if not isinstance(config, dict):
+                config = {"source": config}
+            stream = SpeechToText(
+                model=self.model,
+                interim_model=self.interim_model,
+                decoder=self.decoder,
+                source_id=source_id,
+                source=config.get("source"),
+                priority=config.get("priority", 0),
+                language=language,
+                final_beam_size=final_beam_size,
+                final_word_timestamps=final_word_timestamps,
+                **stt_options
+            )
+            stream.on_source_final_result = self._handle_final
+            stream.on_interim_result = lambda text, sid=source_id: self._handle_interim(sid, text)
+            self.streams[source_id] = stream
+        
+        self.on_final_result = None
+        self.on_interim_result = None
+
+    def _handle_final(self, source_id, text):
+        if self.on_final_result:
+            self.on_final_result(source_id, text)
+        else:
+            print(f"Final [{source_id}]: {text}")
+
+    def _handle_interim(self, source_id, text):
+        if self.on_interim_result:
+            self.on_interim_result(source_id, text)
+
+    def start(self):
+        for stream in self.streams.values():
+            stream.start()
+
+    def stop(self):
+        for stream in self.streams.values():
+            if stream.is_running:
+                stream.stop()
+
+    def get_pipeline_stats(self):
+        stats = {"decoder": dict(self.decoder.stats)}
+        for source_id, stream in self.streams.items():
+            stats[source_id] = stream.get_pipeline_stats()
+        return stats
@@ -0,0 +1,8 @@
+from .streaming import IncrementalTranscriber
+from .audio_buffer import AudioBuffer
+from .worker import TranscriptionWorker, TranscriptionJob
+from .endpointing import Endpointer
+from .sources import AudioSource, MicrophoneSource, WavFileSource, PcmPipeSource, SyntheticSource
+from .scheduler import InterimScheduler
+from .decoder import SharedDecoder, SourceHandle
+from .echo_cancel import EchoCanceller, EchoReference, StreamResampler
@@ -0,0 +1,60 @@
+import numpy as np
+
+class AudioBuffer:
+    """Fixed-capacity float32 sample buffer for one utterance.
+
+    Samples are appended at a write index into an array allocated once, so
+    the buffered audio is always the contiguous slice before that index and
+    view() never copies. clear() just rewinds the index. The caller is
+    expected to finalize before the buffer fills (see free_samples); if it
+    does overflow anyway, the oldest samples are shifted out."""
+
+    def __init__(self, capacity_samples):
+        self.capacity = int(capacity_samples)
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self._length = 0
+        self.dropped_samples = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def is_full(self):
+        return self._length >= self.capacity
+
+    @property
+    def free_samples(self):
+        return self.capacity - self._length
+
+    def clear(self):
+        self._length = 0
+        self.dropped_samples = 0
+        return self
+
+    def append(self, samples):
+        # Returns how many of the oldest samples were dropped to make room
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if len(samples) > self.capacity:
+            samples = samples[-self.capacity:]
+
+        overflow = max(0, self._length + len(samples) - self.capacity)
+        if overflow:
+            kept = self._length - overflow
+            self._buffer[:kept] = self._buffer[overflow:self._length]
+            self._length = kept
+        self._buffer[self._length:self._length + len(samples)] = samples
+        self._length += len(samples)
+        self.dropped_samples += overflow
+        return overflow
+
+    def view(self):
+        # Everything buffered, oldest sample first. Valid until the next
+        # append or clear; copy it if it has to outlive that.
+        return self._buffer[:self._length]
+
+    def tail(self, num_samples):
+        num_samples = min(int(num_samples), self._length)
+        return self._buffer[self._length - num_samples:self._length]
+
+    def duration(self, sample_rate):
+        return self._length / sample_rate
@@ -0,0 +1,115 @@
+# Replays recordings through SpeechToText without a microphone and reports
+# real-time factor, interim latency, time-to-final and dropped frames.
+#
+#   python -m stt_pipeline.benchmark recordings/ --model-size small --device cpu --compute-type int8
+#   python -m stt_pipeline.benchmark --synthetic 5 --speed 0
+
+import argparse
+import time
+from .sources import WavFileSource, SyntheticSource, list_recordings
+
+def wait_until_settled(stt, source, timeout=60.0):
+    source.finished.wait()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if stt.audio_queue.empty() and not stt.is_speaking and stt.transcription_worker.is_idle():
+            return True
+        time.sleep(0.05)
+    return False
+
+def run_source(stt, source, name):
+    stt.transcription_worker.reset_stats()
+    stt.dropped_frames = 0
+    finals = []
+    stt.on_final_result = finals.append
+    stt.on_interim_result = lambda text: None
+
+    started = time.time()
+    stt.start(source=source)
+    settled = wait_until_settled(stt, source)
+    stt.stop()
+    wall_time = time.time() - started
+
+    stats = stt.transcription_worker.stats
+    audio_seconds = getattr(source, "duration", 0.0) or source.frames_delivered * source.blocksize / source.sample_rate
+    result = {
+        "name": name,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall_time,
+        "decode_seconds": stats["total_decode_time"],
+        "rtf": stats["total_decode_time"] / audio_seconds if audio_seconds else 0.0,
+        "interim_passes": stats["interim_completed"],
+        "interim_latency": stats["interim_latency_total"] / stats["interim_completed"] if stats["interim_completed"] else 0.0,
+        "finals": stats["final_completed"],
+        "time_to_final": stats["final_latency_total"] / stats["final_completed"] if stats["final_completed"] else 0.0,
+        "interim_coalesced": stats["interim_coalesced"],
+        "dropped_frames": stt.dropped_frames,
+        "settled": settled,
+        "transcript": " ".join(finals)
+    }
+    return result
+
+def print_result(result):
+    print(f"\n[BENCH] {result['name']}")
+    print(f"  audio {result['audio_seconds']:.2f}s | wall {result['wall_seconds']:.2f}s | decode {result['decode_seconds']:.2f}s | RTF {result['rtf']:.3f}")
+    print(f"  interim passes {result['interim_passes']} (coalesced {result['interim_coalesced']}) | avg interim latency {result['interim_latency'] * 1000:.0f}ms")
+    print(f"  finals {result['finals']} | avg time-to-final {result['time_to_final'] * 1000:.0f}ms | dropped frames {result['dropped_frames']}")
+    if not result["settled"]:
+        print("  WARNING: pipeline did not settle before timeout")
+    print(f"  transcript: {result['transcript']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings through SpeechToText and report STT throughput and latency")
+    parser.add_argument("directory", nargs="?", help="Directory of .wav recordings to replay")
+    parser.add_argument("--synthetic", type=int, default=0, help="Run N synthetic utterances instead of recordings")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed; 1.0 is real time, 0 is as fast as possible")
+    parser.add_argument("--model-size", default="small")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--compute-type", default="float16")
+    parser.add_argument("--interim-model-size", default=None)
+    parser.add_argument("--max-audio-queue-frames", type=int, default=500)
+    args = parser.parse_args()
+
+    if not args.directory and not args.synthetic:
+        parser.error("pass a directory of recordings or --synthetic N")
+
+    from stt_module import SpeechToText
+
+    # Unpaced replay would overflow a realtime-sized queue, so size it to the input
+    queue_frames = args.max_audio_queue_frames if args.speed > 0 else 0
+    stt = SpeechToText(
+        model_size=args.model_size,
+        device=args.device,
+        compute_type=args.compute_type,
+        interim_model_size=args.interim_model_size,
+        max_audio_queue_frames=queue_frames
+    )
+    blocksize = int(stt.vad_frame_ms * stt.sample_rate / 1000)
+
+    sources = []
+    if args.directory:
+        for path in list_recordings(args.directory):
+            sources.append((path, WavFileSource(path, sample_rate=stt.sample_rate, blocksize=blocksize, speed=args.speed)))
+    for i in range(args.synthetic):
+        pattern = [(0.5, "silence"), (2.0 + i % 3, "speech"), (1.5, "silence")]
+        sources.append((f"synthetic-{i + 1}", SyntheticSource(pattern, sample_rate=stt.sample_rate, blocksize=blocksize, speed=args.speed, seed=i)))
+
+    results = []
+    for name, source in sources:
+        result = run_source(stt, source, name)
+        print_result(result)
+        results.append(result)
+
+    if results:
+        audio = sum(r["audio_seconds"] for r in results)
+        decode = sum(r["decode_seconds"] for r in results)
+        finals = sum(r["finals"] for r in results)
+        print("\n" + "=" * 50)
+        print(f"[BENCH] {len(results)} recordings, {audio:.1f}s of audio")
+        print(f"  overall RTF {decode / audio if audio else 0:.3f}")
+        print(f"  avg time-to-final {sum(r['time_to_final'] * r['finals'] for r in results) / finals * 1000 if finals else 0:.0f}ms")
+        print(f"  dropped frames {sum(r['dropped_frames'] for r in results)}")
+        print("=" * 50)
+
+if __name__ == "__main__":
+    main()
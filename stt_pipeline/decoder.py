@@ -0,0 +1,267 @@
+import collections
+import time
+import numpy as np
+from .worker import TranscriptionWorker, TranscriptionJob
+
+try:
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:
+    BatchedInferencePipeline = None
+
+class _SourceState:
+    def __init__(self, source_id, handler, final_handler, priority):
+        self.source_id = source_id
+        self.handler = handler
+        self.final_handler = final_handler
+        self.priority = priority
+        self.finals = collections.deque()
+        self.pending_interim = None
+        self.active = False
+
+class SourceHandle:
+    """What a single SpeechToText sees of a SharedDecoder.
+
+    Mirrors the TranscriptionWorker interface so SpeechToText doesn't care
+    whether it owns its worker or shares one with other sources."""
+
+    def __init__(self, decoder, source_id):
+        self.decoder = decoder
+        self.source_id = source_id
+
+    @property
+    def stats(self):
+        return self.decoder.stats
+
+    def reset_stats(self):
+        self.decoder.reset_stats()
+
+    def start(self):
+        self.decoder.attach(self.source_id)
+
+    def stop(self, timeout=2):
+        self.decoder.detach(self.source_id, timeout=timeout)
+
+    def clear(self):
+        self.decoder.clear_source(self.source_id)
+
+    def submit(self, job):
+        job.source_id = self.source_id
+        self.decoder.submit(job)
+
+    def is_idle(self):
+        return self.decoder.is_source_idle(self.source_id)
+
+    def queue_depth(self):
+        return self.decoder.source_queue_depth(self.source_id)
+
+class SharedDecoder(TranscriptionWorker):
+    """One Whisper decode thread serving several audio sources.
+
+    Finals always go before interims. Sources are served by priority and
+    round-robin within the same priority, so a chatty source can't starve a
+    quiet one. When finals from several sources are waiting they are decoded
+    together through faster-whisper's batched pipeline when it is available."""
+
+    def __init__(self, model, language="en", final_beam_size=5, batch_size=4, sample_rate=16000, word_timestamps=False):
+        super().__init__(self._dispatch, name="SharedDecoder")
+        self.model = model
+        self.language = language
+        self.final_beam_size = final_beam_size
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.word_timestamps = word_timestamps
+        self._sources = {}
+        self._order = []
+        self._turn = 0
+        self._attached = set()
+        self._batched_pipeline = None
+        if BatchedInferencePipeline is not None and batch_size > 1:
+            try:
+                self._batched_pipeline = BatchedInferencePipeline(model=model)
+            except Exception as e:
+                print(f"Batched decoding unavailable, decoding finals one at a time: {str(e)}")
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.stats["batched_decodes"] = 0
+        self.stats["batched_jobs"] = 0
+
+    def register(self, source_id, handler, final_handler, priority=0):
+        with self._condition:
+            self._sources[source_id] = _SourceState(source_id, handler, final_handler, priority)
+            if source_id not in self._order:
+                self._order.append(source_id)
+        return SourceHandle(self, source_id)
+
+    def attach(self, source_id):
+        with self._condition:
+            self._attached.add(source_id)
+        self.start()
+
+    def detach(self, source_id, timeout=2):
+        self.clear_source(source_id)
+        with self._condition:
+            self._attached.discard(source_id)
+            last = not self._attached
+        if last:
+            self.stop(timeout=timeout)
+
+    def clear_source(self, source_id):
+        with self._condition:
+            state = self._sources[source_id]
+            state.finals.clear()
+            state.pending_interim = None
+
+    def clear(self):
+        with self._condition:
+            for state in self._sources.values():
+                state.finals.clear()
+                state.pending_interim = None
+
+    def queue_depth(self):
+        with self._condition:
+            return sum(len(s.finals) + (1 if s.pending_interim else 0) for s in self._sources.values())
+
+    def source_queue_depth(self, source_id):
+        with self._condition:
+            state = self._sources[source_id]
+            return len(state.finals) + (1 if state.pending_interim else 0)
+
+    def is_idle(self):
+        with self._condition:
+            return not self._busy and all(
+                not s.finals and s.pending_interim is None for s in self._sources.values())
+
+    def is_source_idle(self, source_id):
+        with self._condition:
+            state = self._sources[source_id]
+            return not state.active and not state.finals and state.pending_interim is None
+
+    def submit(self, job):
+        if not self.is_running:
+            self.stats["submitted"] += 1
+            self._execute(job)
+            return
+
+        with self._condition:
+            state = self._sources[job.source_id]
+            self.stats["submitted"] += 1
+            if job.kind == TranscriptionJob.INTERIM:
+                if state.pending_interim is not None:
+                    self.stats["interim_coalesced"] += 1
+                state.pending_interim = job
+            else:
+                if state.pending_interim is not None and state.pending_interim.utterance_id == job.utterance_id:
+                    state.pending_interim = None
+                    self.stats["interim_dropped"] += 1
+                state.finals.append(job)
+            self._condition.notify()
+
+    def _service_order(self):
+        # Rotate first, then a stable sort by priority keeps round-robin
+        # order within each priority level
+        if not self._order:
+            return []
+        k = self._turn % len(self._order)
+        self._turn += 1
+        rotated = self._order[k:] + self._order[:k]
+        return sorted((self._sources[sid] for sid in rotated), key=lambda s: -s.priority)
+
+    def _has_work(self):
+        return any(s.finals or s.pending_interim is not None for s in self._sources.values())
+
+    def _next_jobs(self):
+        with self._condition:
+            while self.is_running and not self._has_work():
+                self._condition.wait()
+            if not self.is_running:
+                return []
+
+            order = self._service_order()
+            jobs = []
+            while len(jobs) < self.batch_size:
+                taken = False
+                for state in order:
+                    if state.finals and len(jobs) < self.batch_size:
+                        jobs.append(state.finals.popleft())
+                        taken = True
+                if not taken:
+                    break
+
+            if not jobs:
+                for state in order:
+                    if state.pending_interim is not None:
+                        jobs.append(state.pending_interim)
+                        state.pending_interim = None
+                        break
+
+            self._busy = True
+            for job in jobs:
+                self._sources[job.source_id].active = True
+            return jobs
+
+    def _dispatch(self, job):
+        self._sources[job.source_id].handler(job)
+
+    def _decode_batch(self, jobs):
+        # Utterances are laid end to end and decoded as separate clips in one
+        # batched call; segments are mapped back by their start time
+        clips = []
+        offset = 0.0
+        for job in jobs:
+            duration = len(job.audio) / self.sample_rate
+            clips.append({"start": offset, "end": offset + duration})
+            offset += duration
+
+        segments, _ = self._batched_pipeline.transcribe(
+            np.concatenate([job.audio for job in jobs]),
+            language=self.language,
+            beam_size=self.final_beam_size,
+            batch_size=len(jobs),
+            vad_filter=False,
+            clip_timestamps=clips,
+            word_timestamps=self.word_timestamps
+        )
+
+        per_job = [[] for _ in jobs]
+        for segment in segments:
+            for i, clip in enumerate(clips):
+                if clip["start"] <= segment.start < clip["end"]:
+                    per_job[i].append(segment)
+                    break
+        return [(segs, clip["start"]) for segs, clip in zip(per_job, clips)]
+
+    def _execute_batch(self, jobs):
+        started = time.time()
+        try:
+            results = self._decode_batch(jobs)
+        except Exception as e:
+            print(f"Batched decode failed, decoding one at a time: {str(e)}")
+            for job in jobs:
+                self._execute(job)
+            return
+
+        decode_share = (time.time() - started) / len(jobs)
+        for job, (segments, time_offset) in zip(jobs, results):
+            try:
+                self._sources[job.source_id].final_handler(job, segments, time_offset)
+            except Exception as e:
+                print(f"Error in transcription worker: {str(e)}")
+            self._record_job(job, started, time.time(), decode_time=decode_share)
+        self.stats["batched_decodes"] += 1
+        self.stats["batched_jobs"] += len(jobs)
+
+    def _run(self):
+        while self.is_running:
+            jobs = self._next_jobs()
+            if not jobs:
+                break
+            if len(jobs) > 1 and self._batched_pipeline is not None:
+                self._execute_batch(jobs)
+            else:
+                for job in jobs:
+                    self._execute(job)
+            with self._condition:
+                self._busy = False
+                for job in jobs:
+                    self._sources[job.source_id].active = False
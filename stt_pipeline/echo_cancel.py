@@ -0,0 +1,248 @@
+import collections
+import threading
+import numpy as np
+
+class StreamResampler:
+    """Stateful resampler for audio that arrives in blocks.
+
+    Low-pass FIR (windowed sinc) followed by linear interpolation, with the
+    filter history and fractional read position carried across blocks so
+    block boundaries don't click."""
+
+    def __init__(self, from_rate, to_rate, taps=31):
+        self.step = from_rate / to_rate
+        cutoff = 0.45 * min(1.0, to_rate / from_rate)
+        n = np.arange(taps) - (taps - 1) / 2
+        fir = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        self.fir = (fir / fir.sum()).astype(np.float32)
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        self._last = np.zeros(1, dtype=np.float32)
+        self._position = 1.0
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.step == 1.0 or not len(samples):
+            return samples.copy()
+        padded = np.concatenate([self._history, samples])
+        self._history = padded[len(padded) - len(self._history):]
+        filtered = np.convolve(padded, self.fir, mode="valid")
+        # Index 0 is the last sample of the previous block
+        combined = np.concatenate([self._last, filtered])
+        positions = np.arange(self._position, len(combined) - 1, self.step)
+        out = np.interp(positions, np.arange(len(combined)), combined).astype(np.float32)
+        next_position = positions[-1] + self.step if len(positions) else self._position
+        self._position = next_position - (len(combined) - 1)
+        self._last = combined[-1:]
+        return out
+
+class EchoReference:
+    """Far-end (TTS) signal for the echo canceller.
+
+    The TTS player push()es exactly what it hands to the sound card and the
+    STT pull()s the same amount of audio for each mic frame as it is
+    captured, so the two stay aligned in real time. A missing reference is
+    zero-filled. A backlog beyond max_backlog_ms is dropped, because a
+    reference that falls behind the mic is no longer causal for the filter."""
+
+    def __init__(self, sample_rate=16000, max_backlog_ms=60):
+        self.sample_rate = sample_rate
+        self.max_backlog = int(sample_rate * max_backlog_ms / 1000)
+        self._chunks = collections.deque()
+        self._buffered = 0
+        self._resamplers = {}
+        self._lock = threading.Lock()
+        self.dropped_samples = 0
+
+    def push(self, samples, sample_rate):
+        # Called from the playback callback; keep it cheap
+        resampler = self._resamplers.get(sample_rate)
+        if resampler is None:
+            resampler = self._resamplers[sample_rate] = StreamResampler(sample_rate, self.sample_rate)
+        samples = resampler.process(samples)
+        if not len(samples):
+            return
+        with self._lock:
+            self._chunks.append(samples)
+            self._buffered += len(samples)
+            while self._buffered - len(self._chunks[0]) >= self.max_backlog:
+                dropped = self._chunks.popleft()
+                self._buffered -= len(dropped)
+                self.dropped_samples += len(dropped)
+
+    def pull(self, count):
+        out = np.zeros(count, dtype=np.float32)
+        filled = 0
+        with self._lock:
+            while filled < count and self._chunks:
+                chunk = self._chunks[0]
+                take = min(count - filled, len(chunk))
+                out[filled:filled + take] = chunk[:take]
+                filled += take
+                if take == len(chunk):
+                    self._chunks.popleft()
+                else:
+                    self._chunks[0] = chunk[take:]
+                self._buffered -= take
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._buffered = 0
+
+class EchoCanceller:
+    """Partitioned-block frequency-domain NLMS echo canceller.
+
+    Subtracts an adaptive estimate of Bunny's voice, as picked up by the mic,
+    from each mic frame. The filter spans tail_ms of echo path (device latency
+    plus room reverb) split into one-frame partitions, so a frame costs a few
+    FFTs however long the tail is.
+
+    Adaptation freezes while Lumi is talking over the TTS so her voice
+    doesn't pull the filter off the echo path. Double talk is flagged when
+    either the mic peak is dtd_threshold above its usual ratio to the
+    reference peak (Geigel-style; catches loud speech before the filter has
+    converged), or the residual left after cancellation is
+    residual_threshold above its usual share of the mic signal (catches
+    speech quieter than the echo once the filter has converged). Both
+    baselines are tracked while only Bunny talks, since speaker-to-mic gain
+    and room vary a lot between setups, and the flag is held for
+    dtd_hold_ms so adaptation doesn't resume between syllables.
+
+    A changed echo path (the mic or speakers moved) also raises the
+    residual and would look like double talk forever, so a shadow filter
+    keeps adapting regardless; when it has clearly done better than the
+    frozen filter for a few frames in a row, it replaces it."""
+
+    def __init__(self,
+                 block_size=480,
+                 sample_rate=16000,
+                 tail_ms=300,
+                 step_size=0.5,
+                 dtd_threshold=2.0,
+                 residual_threshold=4.0,
+                 dtd_hold_ms=150,
+                 echo_ratio_smoothing=0.05,
+                 min_reference_level=1e-3,
+                 residual_gain=1.0):
+        self.block_size = block_size
+        self.sample_rate = sample_rate
+        self.partitions = max(1, int(np.ceil(tail_ms * sample_rate / 1000 / block_size)))
+        self.step_size = step_size
+        self.dtd_threshold = dtd_threshold
+        self._log_residual_threshold = np.log(residual_threshold)
+        self.dtd_hold_frames = max(1, int(round(dtd_hold_ms * sample_rate / 1000 / block_size)))
+        self.echo_ratio_smoothing = echo_ratio_smoothing
+        self.min_reference_level = min_reference_level
+        # Extra attenuation applied while only Bunny is talking; 1.0 disables it
+        self.residual_gain = residual_gain
+        self._regularization = 2 * block_size * min_reference_level ** 2
+        self.reset()
+
+    def reset(self):
+        bins = self.block_size + 1
+        self.weights = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._spectra = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._peaks = np.zeros(self.partitions)
+        self._previous = np.zeros(self.block_size)
+        # Smoothed log of mic peak / reference peak, and of residual / mic
+        # energy, while only Bunny talks
+        self._log_echo_ratio = 0.0
+        self._log_residual = 0.0
+        self._hold = 0
+        self._shadow = np.zeros_like(self.weights)
+        self._shadow_wins = 0
+        self.stats = {
+            "frames": 0,
+            "far_end_frames": 0,
+            "double_talk_frames": 0,
+            "resets": 0,
+            "path_changes": 0,
+            "erle_db": 0.0
+        }
+
+    def _estimate(self, weights):
+        n = self.block_size
+        return np.fft.irfft((weights * self._spectra).sum(axis=0), n=2 * n)[n:]
+
+    def _adapt(self, weights, error, power):
+        n = self.block_size
+        error_spectrum = np.fft.rfft(np.concatenate([np.zeros(n), error]))
+        gradient = self.step_size * np.conj(self._spectra) * error_spectrum / power
+        # Constrain each partition to a causal n-tap filter
+        taps = np.fft.irfft(gradient, n=2 * n, axis=1)
+        taps[:, n:] = 0
+        weights += np.fft.rfft(taps, axis=1)
+
+    def process(self, mic, reference):
+        n = self.block_size
+        if len(mic) != n or len(reference) != n:
+            return mic
+        if mic.dtype == np.int16:
+            mic = mic.astype(np.float32) / 32768
+        self.stats["frames"] += 1
+
+        reference = np.asarray(reference, dtype=np.float64)
+        # Newest reference spectrum first, one partition per past frame
+        self._spectra[1:] = self._spectra[:-1]
+        self._spectra[0] = np.fft.rfft(np.concatenate([self._previous, reference]))
+        self._previous = reference
+        self._peaks[1:] = self._peaks[:-1]
+        self._peaks[0] = np.abs(reference).max()
+
+        far_peak = self._peaks.max()
+        if far_peak < self.min_reference_level:
+            return mic
+        self.stats["far_end_frames"] += 1
+
+        error = mic - self._estimate(self.weights)
+        shadow_error = mic - self._estimate(self._shadow)
+        mic_energy = float(np.dot(mic, mic))
+        error_energy = float(np.dot(error, error))
+        shadow_energy = float(np.dot(shadow_error, shadow_error))
+        floor = n * self.min_reference_level ** 2
+        power = (self._spectra.real ** 2 + self._spectra.imag ** 2).sum(axis=0) + self._regularization
+
+        if shadow_energy > 4 * mic_energy + floor:
+            self._shadow[:] = self.weights
+        else:
+            self._adapt(self._shadow, shadow_error, power)
+        # Twice as good for a few frames in a row: the echo path has changed
+        self._shadow_wins = self._shadow_wins + 1 if 2 * shadow_energy < error_energy else 0
+        if self._shadow_wins >= 5:
+            self.weights[:] = self._shadow
+            self._shadow_wins = 0
+            self._hold = 0
+            self.stats["path_changes"] += 1
+            error, error_energy = shadow_error, shadow_energy
+            self._log_residual = np.log((error_energy + floor) / (mic_energy + floor))
+
+        if error_energy > 4 * mic_energy + floor:
+            # Diverged; start over rather than add echo
+            self.weights[:] = 0
+            self._shadow[:] = 0
+            self.stats["resets"] += 1
+            return mic
+
+        mic_peak = np.abs(mic).max()
+        ratio = mic_peak / far_peak
+        log_residual = np.log((error_energy + floor) / (mic_energy + floor))
+        if (ratio > self.dtd_threshold * np.exp(self._log_echo_ratio)
+                or log_residual > self._log_residual + self._log_residual_threshold):
+            self._hold = self.dtd_hold_frames
+        double_talk = self._hold > 0
+        if double_talk:
+            self._hold -= 1
+            self.stats["double_talk_frames"] += 1
+        else:
+            if mic_peak > self.min_reference_level:
+                self._log_echo_ratio += self.echo_ratio_smoothing * (np.log(ratio) - self._log_echo_ratio)
+                self._log_residual += self.echo_ratio_smoothing * (log_residual - self._log_residual)
+            self._adapt(self.weights, error, power)
+
+            if mic_energy > 0:
+                erle = 10 * np.log10(mic_energy / (error_energy + 1e-12))
+                self.stats["erle_db"] = 0.95 * self.stats["erle_db"] + 0.05 * erle
+            error *= self.residual_gain
+
+        return error.astype(np.float32)
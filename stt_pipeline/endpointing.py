@@ -0,0 +1,73 @@
+import re
+
+class Endpointer:
+    """Decides when an utterance is over.
+
+    Keeps a rolling noise-floor estimate from non-speech frames to drive the
+    amplitude gate, ends an utterance after hangover_seconds of silence, and
+    ends it early (after early_hangover_seconds) when the interim transcript
+    covering all of the speech ends in sentence-final punctuation. Only one
+    interim pass runs in the trailing silence, so by default that pass alone
+    decides; stable_updates > 1 also requires that many identical interims
+    in a row."""
+
+    SENTENCE_END = re.compile(r"[.!?…][\"')\]]*$")
+
+    def __init__(self,
+                 frame_ms=30,
+                 hangover_seconds=1.0,
+                 early_hangover_seconds=0.3,
+                 min_gate=0.01,
+                 max_gate=0.2,
+                 gate_ratio=3.0,
+                 initial_noise_floor=0.01,
+                 stable_updates=1):
+        self.frame_ms = frame_ms
+        self.hangover_frames = max(1, int(round(hangover_seconds * 1000 / frame_ms)))
+        self.early_hangover_frames = max(1, int(round(early_hangover_seconds * 1000 / frame_ms)))
+        self.min_gate = min_gate
+        self.max_gate = max_gate
+        self.gate_ratio = gate_ratio
+        self.noise_floor = initial_noise_floor
+        self.stable_updates = stable_updates
+        self.early_endpoints = 0
+        self.reset()
+
+    def reset(self):
+        self.last_interim_text = ""
+        self.last_interim_samples = 0
+        self.stable_count = 0
+
+    def speech_gate(self):
+        return min(self.max_gate, max(self.min_gate, self.noise_floor * self.gate_ratio))
+
+    def update_noise_floor(self, amplitude):
+        # Falls quickly toward quieter frames and rises slowly, so a burst of
+        # missed speech can't drag the floor up
+        alpha = 0.1 if amplitude < self.noise_floor else 0.01
+        self.noise_floor += alpha * (amplitude - self.noise_floor)
+
+    @staticmethod
+    def _normalize(text):
+        return re.sub(r"\s+", " ", text.strip().lower())
+
+    def on_interim(self, text, covered_samples):
+        if self._normalize(text) == self._normalize(self.last_interim_text):
+            self.stable_count += 1
+        else:
+            self.stable_count = 1
+        self.last_interim_text = text
+        self.last_interim_samples = covered_samples
+
+    def is_settled(self, buffered_samples):
+        return (self.last_interim_samples >= buffered_samples
+                and self.stable_count >= self.stable_updates
+                and bool(self.SENTENCE_END.search(self.last_interim_text.strip())))
+
+    def should_end(self, silence_frames, buffered_samples):
+        if silence_frames >= self.hangover_frames:
+            return True
+        if silence_frames >= self.early_hangover_frames and self.is_settled(buffered_samples):
+            self.early_endpoints += 1
+            return True
+        return False
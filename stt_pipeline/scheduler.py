@@ -0,0 +1,65 @@
+class InterimScheduler:
+    """Paces interim passes from measured decode cost.
+
+    Keeps a smoothed estimate of how long an interim decode takes and stretches
+    the interval so decoding uses at most cpu_budget of wall time. When even
+    that isn't enough the decode window is shrunk, and it grows back once
+    passes are cheap again."""
+
+    def __init__(self,
+                 base_interval=0.3,
+                 min_audio_seconds=0.6,
+                 cpu_budget=0.5,
+                 max_interval=2.0,
+                 min_window=2.0,
+                 max_window=5.0,
+                 smoothing=0.3):
+        self.base_interval = base_interval
+        self.min_audio_seconds = min_audio_seconds
+        self.cpu_budget = cpu_budget
+        self.max_interval = max_interval
+        self.min_window = min_window
+        self.max_window = max_window
+        self.smoothing = smoothing
+
+        self.interval = base_interval
+        self.window_seconds = max_window
+        self.avg_decode_time = 0.0
+        self.avg_audio_seconds = 0.0
+        self.passes = 0
+        self.skipped_busy = 0
+
+    def should_run(self, now, last_update_time, buffer_seconds, worker_idle=True):
+        if buffer_seconds < self.min_audio_seconds or now - last_update_time < self.interval:
+            return False
+        if not worker_idle:
+            # Previous pass still decoding; queueing another would just run back to back
+            self.skipped_busy += 1
+            return False
+        return True
+
+    def record(self, decode_time, audio_seconds):
+        if self.passes == 0:
+            self.avg_decode_time = decode_time
+            self.avg_audio_seconds = audio_seconds
+        else:
+            self.avg_decode_time += self.smoothing * (decode_time - self.avg_decode_time)
+            self.avg_audio_seconds += self.smoothing * (audio_seconds - self.avg_audio_seconds)
+        self.passes += 1
+
+        wanted_interval = self.avg_decode_time / self.cpu_budget
+        self.interval = min(self.max_interval, max(self.base_interval, wanted_interval))
+
+        if wanted_interval > self.base_interval:
+            self.window_seconds = max(self.min_window, self.window_seconds * 0.8)
+        elif wanted_interval < self.base_interval * 0.5:
+            self.window_seconds = min(self.max_window, self.window_seconds * 1.1)
+
+    def get_stats(self):
+        return {
+            "interim_interval": self.interval,
+            "interim_window": self.window_seconds,
+            "avg_interim_decode_time": self.avg_decode_time,
+            "avg_interim_audio_seconds": self.avg_audio_seconds,
+            "interim_skipped_busy": self.skipped_busy
+        }
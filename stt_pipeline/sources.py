@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+import time
+import wave
+import numpy as np
+
+class AudioSource:
+    """Feeds mono float32 frames of blocksize samples to a callback.
+
+    Subclasses implement _frames() as a generator; the base class runs it on a
+    background thread, optionally paced to real time (speed=1.0), faster
+    (speed>1) or as fast as possible (speed=0)."""
+
+    def __init__(self, sample_rate=16000, blocksize=480, speed=1.0, tail_silence_seconds=0.0):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.speed = speed
+        self.tail_silence_seconds = tail_silence_seconds
+        self.callback = None
+        self.frames_delivered = 0
+        self.finished = threading.Event()
+        self._stop_requested = False
+        self._thread = None
+
+    def _frames(self):
+        raise NotImplementedError
+
+    def _blocks(self, samples):
+        # Splits a sample array into blocksize frames, zero-padding the last one
+        for start in range(0, len(samples), self.blocksize):
+            frame = samples[start:start + self.blocksize]
+            if len(frame) < self.blocksize:
+                frame = np.pad(frame, (0, self.blocksize - len(frame)))
+            yield frame.astype(np.float32, copy=False)
+
+    def _silence(self):
+        for _ in range(int(self.tail_silence_seconds * self.sample_rate / self.blocksize)):
+            yield np.zeros(self.blocksize, dtype=np.float32)
+
+    def _run(self):
+        frame_duration = self.blocksize / self.sample_rate
+        next_time = time.perf_counter()
+        try:
+            for frames in (self._frames(), self._silence()):
+                for frame in frames:
+                    if self._stop_requested:
+                        return
+                    if self.speed > 0:
+                        next_time += frame_duration / self.speed
+                        delay = next_time - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self.callback(frame)
+                    self.frames_delivered += 1
+        except Exception as e:
+            print(f"Error in audio source: {str(e)}")
+        finally:
+            self.finished.set()
+
+    def start(self, callback):
+        self.callback = callback
+        self._stop_requested = False
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_requested = True
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+class MicrophoneSource(AudioSource):
+    def __init__(self, sample_rate=16000, blocksize=480, device=None):
+        super().__init__(sample_rate=sample_rate, blocksize=blocksize)
+        self.device = device
+        self.stream = None
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"Status: {status}")
+        self.callback(indata[:, 0].copy())
+        self.frames_delivered += 1
+
+    def start(self, callback):
+        # Imported here so file/pipe/synthetic sources work without PortAudio
+        import sounddevice as sd
+
+        self.callback = callback
+        self.finished.clear()
+        self.stream = sd.InputStream(
+            callback=self._audio_callback,
+            channels=1,
+            samplerate=self.sample_rate,
+            blocksize=self.blocksize,
+            device=self.device
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.finished.set()
+
+def resample(samples, from_rate, to_rate):
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    duration = len(samples) / from_rate
+    target_length = int(round(duration * to_rate))
+    positions = np.linspace(0, len(samples) - 1, target_length)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def pcm_to_float(raw, sample_width):
+    if sample_width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if sample_width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    if sample_width == 4:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    raise ValueError(f"Unsupported sample width: {sample_width}")
+
+class WavFileSource(AudioSource):
+    def __init__(self, path, sample_rate=16000, blocksize=480, speed=1.0, tail_silence_seconds=2.0):
+        super().__init__(sample_rate, blocksize, speed, tail_silence_seconds)
+        self.path = path
+        self.duration = 0.0
+
+    def load(self):
+        with wave.open(self.path, "rb") as wav:
+            channels = wav.getnchannels()
+            file_rate = wav.getframerate()
+            samples = pcm_to_float(wav.readframes(wav.getnframes()), wav.getsampwidth())
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        samples = resample(samples, file_rate, self.sample_rate)
+        self.duration = len(samples) / self.sample_rate
+        return samples
+
+    def _frames(self):
+        return self._blocks(self.load())
+
+class PcmPipeSource(AudioSource):
+    # Raw little-endian 16-bit mono PCM at sample_rate, e.g. from
+    # `ffmpeg -i input -f s16le -ac 1 -ar 16000 -`
+    def __init__(self, stream=None, sample_rate=16000, blocksize=480, speed=0, tail_silence_seconds=2.0):
+        super().__init__(sample_rate, blocksize, speed, tail_silence_seconds)
+        self.stream = stream or sys.stdin.buffer
+
+    def _frames(self):
+        frame_bytes = self.blocksize * 2
+        while True:
+            raw = self.stream.read(frame_bytes)
+            if not raw:
+                break
+            raw = raw[:len(raw) - len(raw) % 2]
+            yield from self._blocks(pcm_to_float(raw, 2))
+
+class SyntheticSource(AudioSource):
+    """Generates speech-like bursts separated by silence.
+
+    pattern is a list of (seconds, kind) where kind is "speech" (a harmonic
+    tone with a syllable-rate envelope plus noise), "noise" or "silence"."""
+
+    def __init__(self, pattern=None, sample_rate=16000, blocksize=480, speed=1.0, noise_level=0.002, seed=0):
+        super().__init__(sample_rate, blocksize, speed)
+        self.pattern = pattern or [(1.0, "silence"), (3.0, "speech"), (1.5, "silence")]
+        self.noise_level = noise_level
+        self.rng = np.random.default_rng(seed)
+        self.duration = sum(seconds for seconds, _ in self.pattern)
+
+    def _segment(self, seconds, kind):
+        n = int(seconds * self.sample_rate)
+        t = np.arange(n) / self.sample_rate
+        samples = self.rng.normal(0, self.noise_level, n)
+        if kind == "speech":
+            pitch = 180 + 20 * np.sin(2 * np.pi * 0.5 * t)
+            phase = 2 * np.pi * np.cumsum(pitch) / self.sample_rate
+            voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+            samples += 0.2 * voice * envelope
+        elif kind == "noise":
+            samples += self.rng.normal(0, 0.05, n)
+        return samples.astype(np.float32)
+
+    def _frames(self):
+        for seconds, kind in self.pattern:
+            yield from self._blocks(self._segment(seconds, kind))
+
+def list_recordings(directory, extensions=(".wav",)):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(extensions)
+    )
@@ -0,0 +1,93 @@
+import re
+
+class IncrementalTranscriber:
+    """Local-agreement streaming decoder for interim results.
+
+    Only the audio after the last committed word is decoded on each update, so
+    the cost of an interim pass stays bounded by window_seconds no matter how
+    long the utterance gets. A word is committed once two consecutive passes
+    agree on it, and committed text is never decoded again."""
+
+    def __init__(self, model, language="en", sample_rate=16000, window_seconds=5.0, beam_size=1, prompt_chars=200):
+        self.model = model
+        self.language = language
+        self.sample_rate = sample_rate
+        self.window_seconds = window_seconds
+        self.beam_size = beam_size
+        self.prompt_chars = prompt_chars
+        self.reset()
+
+    def reset(self):
+        self.committed_words = []
+        self.committed_samples = 0
+        # Tentative words from the previous pass as (start_sample, end_sample, word)
+        self.hypothesis = []
+        self.last_decoded_samples = 0
+
+    @staticmethod
+    def _normalize(word):
+        return re.sub(r"[^\w']", "", word.lower())
+
+    def committed_text(self):
+        return "".join(self.committed_words).strip()
+
+    def _prompt(self):
+        committed = self.committed_text()
+        if not committed:
+            return None
+        return committed[-self.prompt_chars:]
+
+    def _force_commit(self, cutoff_sample):
+        # Nothing has agreed for a whole window: settle whatever the last pass
+        # heard before the cutoff so the tail can slide forward.
+        while self.hypothesis and self.hypothesis[0][1] <= cutoff_sample:
+            _, end, word = self.hypothesis.pop(0)
+            self.committed_words.append(word)
+            self.committed_samples = end
+        self.committed_samples = max(self.committed_samples, cutoff_sample)
+
+    def update(self, audio, audio_offset=0):
+        # `audio` is the utterance from sample `audio_offset` on; anything
+        # before that is committed without being decoded
+        max_samples = int(self.window_seconds * self.sample_rate)
+        cutoff = max(audio_offset + len(audio) - max_samples, audio_offset)
+        if cutoff > self.committed_samples:
+            self._force_commit(cutoff)
+
+        offset = self.committed_samples
+        tail = audio[offset - audio_offset:]
+        self.last_decoded_samples = len(tail)
+        if len(tail) == 0:
+            return self.committed_text()
+
+        segments, _ = self.model.transcribe(
+            tail,
+            beam_size=self.beam_size,
+            language=self.language,
+            vad_filter=False,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=self._prompt()
+        )
+
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                start = offset + int(word.start * self.sample_rate)
+                end = offset + int(word.end * self.sample_rate)
+                words.append((start, end, word.word))
+
+        agreed = 0
+        for previous, current in zip(self.hypothesis, words):
+            if self._normalize(previous[2]) != self._normalize(current[2]):
+                break
+            agreed += 1
+
+        for _, end, word in words[:agreed]:
+            self.committed_words.append(word)
+            self.committed_samples = max(self.committed_samples, end)
+
+        self.hypothesis = words[agreed:]
+
+        tentative = "".join(word for _, _, word in self.hypothesis)
+        return (self.committed_text() + tentative).strip()
@@ -0,0 +1,153 @@
+import collections
+import threading
+import time
+
+class TranscriptionJob:
+    INTERIM = "interim"
+    FINAL = "final"
+
+    def __init__(self, kind, utterance_id, audio, speech_ended_at=None, source_id=None, offset=0):
+        self.kind = kind
+        self.source_id = source_id
+        self.utterance_id = utterance_id
+        self.audio = audio
+        # Samples of the utterance before `audio`; interim jobs leave out what
+        # the incremental transcriber has already committed
+        self.offset = offset
+        self.created_at = time.time()
+        # For finals: when the last speech frame was heard, so time-to-final
+        # includes the endpointing hangover
+        self.speech_ended_at = speech_ended_at
+
+class TranscriptionWorker:
+    """Runs Whisper decodes off the VAD thread.
+
+    Final jobs are queued in order and always run. Only the newest interim job
+    is kept: submitting another interim replaces a pending one, and a final for
+    the same utterance drops it, since either way nobody would see its text."""
+
+    def __init__(self, handler, name="TranscriptionWorker"):
+        self.handler = handler
+        self.name = name
+        self._finals = collections.deque()
+        self._pending_interim = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self.is_running = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "interim_coalesced": 0,
+            "interim_dropped": 0,
+            "last_lag": 0.0,
+            "max_lag": 0.0,
+            "last_decode_time": 0.0,
+            "total_decode_time": 0.0,
+            "interim_completed": 0,
+            "interim_latency_total": 0.0,
+            "final_completed": 0,
+            "final_latency_total": 0.0,
+            "last_final_latency": 0.0
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        with self._condition:
+            self.is_running = False
+            self._condition.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def clear(self):
+        with self._condition:
+            self._finals.clear()
+            self._pending_interim = None
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._finals) + (1 if self._pending_interim else 0)
+
+    def is_idle(self):
+        with self._condition:
+            return not self._busy and not self._finals and self._pending_interim is None
+
+    def submit(self, job):
+        if not self.is_running:
+            # No worker thread (e.g. offline replay): decode inline
+            self.stats["submitted"] += 1
+            self._execute(job)
+            return
+
+        with self._condition:
+            self.stats["submitted"] += 1
+            if job.kind == TranscriptionJob.INTERIM:
+                if self._pending_interim is not None:
+                    self.stats["interim_coalesced"] += 1
+                self._pending_interim = job
+            else:
+                if self._pending_interim is not None and self._pending_interim.utterance_id == job.utterance_id:
+                    self._pending_interim = None
+                    self.stats["interim_dropped"] += 1
+                self._finals.append(job)
+            self._condition.notify()
+
+    def _next_job(self):
+        with self._condition:
+            while self.is_running and not self._finals and self._pending_interim is None:
+                self._condition.wait()
+            if not self.is_running:
+                return None
+            self._busy = True
+            if self._finals:
+                return self._finals.popleft()
+            job = self._pending_interim
+            self._pending_interim = None
+            return job
+
+    def _execute(self, job):
+        started = time.time()
+        try:
+            self.handler(job)
+        except Exception as e:
+            print(f"Error in transcription worker: {str(e)}")
+        self._record_job(job, started, time.time())
+
+    def _record_job(self, job, started, finished, decode_time=None):
+        lag = started - job.created_at
+        self.stats["last_lag"] = lag
+        self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+        if decode_time is None:
+            decode_time = finished - started
+        self.stats["last_decode_time"] = decode_time
+        self.stats["total_decode_time"] += decode_time
+        self.stats["completed"] += 1
+        
+        if job.kind == TranscriptionJob.INTERIM:
+            self.stats["interim_completed"] += 1
+            self.stats["interim_latency_total"] += finished - job.created_at
+        else:
+            latency = finished - (job.speech_ended_at or job.created_at)
+            self.stats["final_completed"] += 1
+            self.stats["final_latency_total"] += latency
+            self.stats["last_final_latency"] = latency
+
+    def _run(self):
+        while self.is_running:
+            job = self._next_job()
+            if job is None:
+                break
+            self._execute(job)
+            with self._condition:
+                self._busy = False
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_pipeline.audio_buffer import AudioBuffer
+
+def test_appends_are_one_contiguous_view():
+    buffer = AudioBuffer(10)
+    buffer.append(np.arange(4))
+    buffer.append(np.arange(4, 7))
+
+    assert np.array_equal(buffer.view(), np.arange(7))
+    assert np.array_equal(buffer.tail(2), [5, 6])
+    assert buffer.free_samples == 3
+
+    buffer.clear()
+    buffer.append([9])
+    assert np.array_equal(buffer.view(), [9])
+
+def test_overflow_drops_the_oldest_samples():
+    buffer = AudioBuffer(5)
+    buffer.append(np.arange(4))
+
+    assert buffer.append(np.arange(4, 7)) == 2
+    assert np.array_equal(buffer.view(), np.arange(2, 7))
+    assert buffer.is_full
+    assert buffer.append(np.arange(7, 15)) == 5
+    assert np.array_equal(buffer.view(), np.arange(10, 15))
+    assert buffer.dropped_samples == 7
@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import ChatHistory
+from context_window import ContextWindow
+
+def test_first_message_sent_without_persona():
+    history = ChatHistory()
+    window = ContextWindow(history)
+    history.add_user_message("hello")
+
+    prefix, start = window.prepare()
+
+    assert prefix == []
+    assert history.messages[start:] == [{"role": "user", "content": "hello"}]
+
+def test_first_message_sent_after_clear():
+    history = ChatHistory("You are Bunny.")
+    window = ContextWindow(history)
+    history.add_user_message("hi")
+    window.prepare()
+
+    history.clear()
+    history.add_user_message("hello again")
+    prefix, start = window.prepare()
+
+    assert prefix == []
+    assert history.messages[start:] == [{"role": "user", "content": "hello again"}]
+
+def test_persona_is_prefix_not_window():
+    history = ChatHistory("You are Bunny.")
+    window = ContextWindow(history)
+    history.add_user_message("hello")
+
+    prefix, start = window.prepare()
+
+    assert prefix == [{"role": "system", "content": "You are Bunny."}]
+    assert start == 1
+
+def test_exact_counts_run_off_the_calling_thread():
+    caller = threading.current_thread()
+    counted_on = set()
+
+    def token_counter(text):
+        counted_on.add(threading.current_thread())
+        return len(text.split())
+
+    history = ChatHistory("You are Bunny.")
+    window = ContextWindow(history, token_counter=token_counter, max_prompt_tokens=60, token_cache_size=8)
+    for i in range(10):
+        history.add_user_message(f"question {i} " + "word " * 10)
+        history.add_assistant_message(f"answer {i} " + "word " * 10)
+        window.prepare()
+        window.maybe_compact()
+        window._summary_thread.join()
+
+    assert counted_on and caller not in counted_on
+    assert window.window_start > 1
+    assert len(window._token_cache) <= 8
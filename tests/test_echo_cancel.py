@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_pipeline.echo_cancel import EchoCanceller
+
+SAMPLE_RATE = 16000
+BLOCK = 480
+
+def _speech_like(rng, n, level, rate):
+    x = np.convolve(rng.standard_normal(n), np.ones(4) / 4, "same")
+    x *= 0.3 + 0.7 * np.abs(np.sin(np.arange(n) / SAMPLE_RATE * 2 * np.pi * rate))
+    return (x / np.sqrt(np.mean(x ** 2)) * level).astype(np.float32)
+
+def _erle_db(mic, out):
+    return 10 * np.log10(np.mean(mic ** 2) / np.mean(out ** 2))
+
+def test_adaptation_freezes_during_double_talk():
+    rng = np.random.default_rng(0)
+    seconds, talk_start, talk_end = 10, 5, 7
+    far = _speech_like(rng, SAMPLE_RATE * seconds, 0.1, 1.7)
+    path = np.zeros(int(0.15 * SAMPLE_RATE))
+    path[400] = 0.5
+    path[400:] += rng.standard_normal(len(path) - 400) * 0.04 * np.exp(-np.arange(len(path) - 400) / 300)
+    echo = np.convolve(far, path)[:len(far)]
+    near = np.zeros_like(echo)
+    talk = slice(talk_start * SAMPLE_RATE, talk_end * SAMPLE_RATE)
+    # Lumi as loud as Bunny's echo, so the peak test alone doesn't see her
+    near[talk] = _speech_like(rng, talk.stop - talk.start, np.sqrt(np.mean(echo ** 2)), 2.3)
+    mic = (echo + near).astype(np.float32)
+
+    canceller = EchoCanceller(BLOCK, SAMPLE_RATE, tail_ms=300)
+    outs = []
+    frozen_from = frozen_until = None
+    for k in range(len(mic) // BLOCK):
+        if k == int((talk_start + 0.2) * SAMPLE_RATE / BLOCK):
+            frozen_from = canceller.weights.copy()
+        if k == int(talk_end * SAMPLE_RATE / BLOCK):
+            frozen_until = canceller.weights.copy()
+        outs.append(canceller.process(mic[k * BLOCK:(k + 1) * BLOCK], far[k * BLOCK:(k + 1) * BLOCK]))
+    out = np.concatenate(outs)
+
+    assert canceller.stats["double_talk_frames"] >= (talk_end - talk_start - 0.2) * SAMPLE_RATE / BLOCK
+    np.testing.assert_array_equal(frozen_from, frozen_until)
+    # Lumi comes through untouched and the echo is still cancelled afterwards
+    assert abs(_erle_db(out[talk], near[talk])) < 1.0
+    after = slice((seconds - 2) * SAMPLE_RATE, seconds * SAMPLE_RATE)
+    assert _erle_db(mic[after], out[after]) > 25
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_pipeline.endpointing import Endpointer
+
+SAMPLE_RATE = 16000
+
+def _silence_frames_until_end(endpointer, buffered_samples, limit=100):
+    for silence_frames in range(1, limit):
+        if endpointer.should_end(silence_frames, buffered_samples):
+            return silence_frames
+    return None
+
+def test_finished_sentence_ends_early_after_one_interim():
+    # As in SpeechToText: interims while speaking, then a single pass over
+    # all of the speech once the silence starts
+    endpointer = Endpointer(frame_ms=30, hangover_seconds=1.0, early_hangover_seconds=0.3)
+    endpointer.on_interim("What time is", SAMPLE_RATE)
+    buffered = 2 * SAMPLE_RATE
+    endpointer.on_interim("What time is it?", buffered)
+
+    assert _silence_frames_until_end(endpointer, buffered) == endpointer.early_hangover_frames
+    assert endpointer.early_endpoints == 1
+
+def test_unfinished_sentence_waits_for_full_hangover():
+    endpointer = Endpointer(frame_ms=30, hangover_seconds=1.0, early_hangover_seconds=0.3)
+    buffered = 2 * SAMPLE_RATE
+    endpointer.on_interim("What time is", buffered)
+    assert _silence_frames_until_end(endpointer, buffered) == endpointer.hangover_frames
+
+    # An interim that missed the end of the speech can't end it early either
+    endpointer.reset()
+    endpointer.on_interim("What time is it?", buffered - SAMPLE_RATE // 2)
+    assert _silence_frames_until_end(endpointer, buffered) == endpointer.hangover_frames
+    assert endpointer.early_endpoints == 0
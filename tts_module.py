@@ -1,23 +1,38 @@
-import requests
-import io
-import tempfile
-from mutagen.mp3 import MP3
-import os
-import pygame
 import numpy as np
 import librosa
-import sounddevice as sd
 import threading
 import re
 import queue
 import time
-import random
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from tts_pipeline import SentenceChunker, TTSClient, AudioCache, PcmStream, StreamingPlayer, VoiceEffectsWorker, check_mp3_support, decode_mp3
+
+class SpeechItem:
+    # One unit of work flowing text queue -> synthesis -> playback. A response
+    # is any number of text items followed by an end marker, so playback
+    # started/finished fire once per response rather than once per sentence.
+    def __init__(self, response_id, text=None, is_end=False, callback=None, cancelled=None, pitch_factor=1.0):
+        self.response_id = response_id
+        self.text = text
+        self.pitch_factor = pitch_factor
+        self.is_end = is_end
+        self.callback = callback
+        self.audio = None
+        self.duration = 0.0
+        self.future = None
+        self.stream = None
+        # Set by TTSEngine.interrupt(); the item is dropped wherever it is
+        self.cancelled = cancelled or threading.Event()
 
 class TTSEngine:
-    def __init__(self, voice="en-US-AnaNeural", speed=1.15, api_url="http://localhost:5050/v1/audio/speech"):
+    def __init__(self, voice="en-US-AnaNeural", speed=1.15, api_url="http://localhost:5050/v1/audio/speech", prefetch_depth=3, cache=None, use_cache=True, streaming_playback=False, pcm_sample_rate=24000, pitch_factor=1.0, pitch_engine="fast"):
         self.voice = voice
         self.speed = speed
+        # Text waiting for synthesis, and synthesized clips waiting to play.
+        # Splitting the two lets sentence N+1 synthesize while N is playing.
         self.audio_queue = queue.Queue()
+        self.playback_queue = queue.Queue()
         self.is_running = False
         self.is_speaking = False
         self.was_speaking = False
@@ -26,15 +41,60 @@ class TTSEngine:
             "Content-Type": "application/json",
             "Authorization": "Bearer your_api_key_here"  # Replace if needed
         }
+        # MP3 clips are decoded in memory, which needs libsndfile 1.1+
+        check_mp3_support()
+        self.client = TTSClient(self.api_url, headers=self.headers, pool_size=prefetch_depth + 1)
+        # Repeated lines (greetings, acknowledgements) play from cache with no request
+        self.cache = cache or (AudioCache() if use_cache else None)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Streaming mode asks the server for raw PCM and starts playing after
+        # the first few KB instead of after the whole MP3 has downloaded.
+        # Either way clips play through the player, whose audio callback
+        # marks the exact start and end of playback.
+        self.streaming_playback = streaming_playback
+        self.pcm_sample_rate = pcm_sample_rate
+        self.player = StreamingPlayer(sample_rate=pcm_sample_rate)
         
-        pygame.mixer.init()
-        pygame.mixer.music.set_endevent(pygame.USEREVENT)
+        # Default pitch for every response; speak() can override it per call.
+        # "fast" shifts pitch block by block in a worker process; "librosa"
+        # is the original offline path
+        self.pitch_factor = pitch_factor
+        self.pitch_engine = pitch_engine
+        self.voice_effects = VoiceEffectsWorker() if pitch_engine == "fast" else None
+        self._pitch_tag = self.voice_effects.cache_tag if self.voice_effects else f"librosa-{librosa.__version__}"
+        self.echo_reference = None
         
-        self.end_event_thread = threading.Thread(target=self._monitor_playback_end)
-        self.end_event_thread.daemon = True
-        self.end_event_thread.start()
+        # Up to prefetch_depth clips are synthesized concurrently ahead of the
+        # one playing. A slot is released when the playback thread takes the
+        # synthesized clip to play it; a streamed clip keeps its slot until
+        # it has finished playing, since it is still downloading meanwhile
+        self.prefetch_depth = prefetch_depth
+        self._prefetch_slots = threading.Semaphore(prefetch_depth)
+        self._synth_pool = ThreadPoolExecutor(max_workers=prefetch_depth, thread_name_prefix="tts-synth")
         
         self.current_thread = None
+        self.playback_thread = None
+        self._response_ids = itertools.count(1)
+        self._stream_chunker = None
+        self._stream_response_id = None
+        self._stream_pitch = 1.0
+        
+        # Every item carries the cancel event that was current when it was
+        # queued; interrupt() sets it and swaps in a fresh one, so everything
+        # queued before the interrupt is dropped at once
+        self._cancel_event = threading.Event()
+        self._interrupt_lock = threading.Lock()
+        self._stream_cancelled = None
+        # What has been heard of the response currently playing
+        self._spoken_response_id = None
+        self._spoken_parts = []
+        self._current_item = None
+        # Responses whose end marker has not reached the playback thread yet,
+        # with their cancel event; they are queued, synthesizing or playing
+        self._open_responses = {}
+        self._open_lock = threading.Lock()
 
     def start(self):
         if self.is_running:
@@ -49,11 +109,25 @@ class TTSEngine:
             self.queue_thread = threading.Thread(target=self.process_audio_queue)
             self.queue_thread.daemon = True
             self.queue_thread.start()
+        
+        if not self.playback_thread or not self.playback_thread.is_alive():
+            self.playback_thread = threading.Thread(target=self._playback_loop)
+            self.playback_thread.daemon = True
+            self.playback_thread.start()
 
     def set_prompter(self, prompter):
         self.prompter = prompter
 
-    def speak_with_callback(self, text, callback=None):
+    def set_echo_reference(self, echo_reference):
+        # Played audio is mirrored here so the STT can cancel it from the mic
+        self.echo_reference = echo_reference
+        self.player.echo_reference = echo_reference
+
+    def _pitch(self, pitch_factor):
+        factor = self.pitch_factor if pitch_factor is None else pitch_factor
+        return factor if factor > 0 else 1.0
+
+    def speak_with_callback(self, text, callback=None, pitch_factor=None):
         if not text:
             return
             
@@ -61,107 +135,334 @@ class TTSEngine:
         if not cleaned_text:
             return
         
-        if hasattr(self, 'on_playback_started') and callable(self.on_playback_started):
-            self.on_playback_started()
-            
-        data = {
-            "input": cleaned_text,
-            "voice": self.voice,
-            "response_format": "mp3",
-            "speed": self.speed
-        }
+        if not self.is_running:
+            self.start()
+        
+        response_id = next(self._response_ids)
+        cancelled = self._cancel_event
+        self._open_response(response_id, cancelled)
+        self.audio_queue.put(SpeechItem(response_id, text=cleaned_text, cancelled=cancelled, pitch_factor=self._pitch(pitch_factor)))
+        self.audio_queue.put(SpeechItem(response_id, is_end=True, callback=callback, cancelled=cancelled))
+        return response_id
+
+    def begin_stream(self, pitch_factor=None):
+        # Starts a response that arrives piece by piece (e.g. LLM fragments)
+        self._stream_chunker = SentenceChunker()
+        self._stream_pitch = self._pitch(pitch_factor)
+        self._stream_response_id = next(self._response_ids)
+        self._stream_cancelled = self._cancel_event
+        self._open_response(self._stream_response_id, self._stream_cancelled)
+        return self._stream_response_id
+
+    def feed_stream(self, fragment):
+        if self._stream_chunker is None:
+            self.begin_stream()
+        for chunk in self._stream_chunker.feed(fragment):
+            cleaned_text = self.clean_text_for_speech(chunk)
+            if cleaned_text:
+                self.audio_queue.put(SpeechItem(self._stream_response_id, text=cleaned_text, cancelled=self._stream_cancelled, pitch_factor=self._stream_pitch))
+
+    def end_stream(self):
+        if self._stream_chunker is None:
+            return
+        rest = self._stream_chunker.flush()
+        cleaned_text = self.clean_text_for_speech(rest) if rest else None
+        if cleaned_text:
+            self.audio_queue.put(SpeechItem(self._stream_response_id, text=cleaned_text, cancelled=self._stream_cancelled, pitch_factor=self._stream_pitch))
+        self.audio_queue.put(SpeechItem(self._stream_response_id, is_end=True, cancelled=self._stream_cancelled))
+        self._stream_chunker = None
+        self._stream_response_id = None
+        self._stream_cancelled = None
+
+    def _open_response(self, response_id, cancelled):
+        with self._open_lock:
+            self._open_responses[response_id] = cancelled
+
+    def _close_response(self, response_id):
+        with self._open_lock:
+            self._open_responses.pop(response_id, None)
+
+    def has_pending_speech(self):
+        # True while a response that was not interrupted is playing, queued
+        # or still synthesizing
+        if self.is_speaking:
+            return True
+        with self._open_lock:
+            return any(not cancelled.is_set() for cancelled in self._open_responses.values())
+
+    def _fetch_speech(self, text, cancelled=None):
+        if not self.cache:
+            return self.client.synthesize(text, self.voice, self.speed, cancelled=cancelled)
+        
+        key = AudioCache.make_key(text, self.voice, self.speed, "mp3")
+        content = self.cache.get(key)
+        if content is not None:
+            return content
+        
+        # Identical lines prefetched side by side share one request
+        with self._inflight_lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                self._inflight[key] = threading.Event()
+        if pending is not None:
+            pending.wait()
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+            return self.client.synthesize(text, self.voice, self.speed, cancelled=cancelled)
+        
+        try:
+            content = self.client.synthesize(text, self.voice, self.speed, cancelled=cancelled)
+            if content is not None:
+                self.cache.put(key, content)
+            return content
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key).set()
+
+    def _synthesize(self, text, cancelled=None):
+        # Decoded here on the synth pool so the playback thread only plays
+        content = self._fetch_speech(text, cancelled)
+        if content is None:
+            return None, 0.0
+        
+        samples, sr = decode_mp3(content, sample_rate=self.pcm_sample_rate)
+        return samples, len(samples) / sr
+
+    def _shifted_blocks(self, samples, sr, pitch_factor):
+        if self.voice_effects:
+            yield from self.voice_effects.shift_blocks(samples, sr, pitch_factor)
+            return
+        n_steps = 12 * np.log2(pitch_factor)
+        yield librosa.effects.pitch_shift(y=samples, sr=sr, n_steps=n_steps)
+
+    def _stream_shifted(self, text, sink, pitch_factor, cancelled=None):
+        # Each shifted block goes to the player as soon as it comes back, so
+        # playback starts after the first block rather than the whole clip
+        key = None
+        if self.cache:
+            key = AudioCache.make_key(text, self.voice, self.speed, "pcm", pitch_factor, self._pitch_tag)
+            content = self.cache.get(key)
+            if content is not None:
+                sink.put(content)
+                sink.close()
+                return content
         
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=data)
+            content = self._fetch_speech(text, cancelled)
+            if content is None:
+                sink.close(failed=True)
+                return None
+            samples, sr = decode_mp3(content, sample_rate=self.pcm_sample_rate)
+            parts = []
+            for block in self._shifted_blocks(samples, sr, pitch_factor):
+                if cancelled is not None and cancelled.is_set():
+                    sink.close(failed=True)
+                    return None
+                data = (np.clip(block, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+                parts.append(data)
+                sink.put(data)
+        except Exception as e:
+            print(f"Error shifting pitch: {str(e)}")
+            sink.close(failed=True)
+            return None
+        sink.close()
+        
+        content = b"".join(parts)
+        if key:
+            self.cache.put(key, content)
+        return content
+
+    def _stream_speech(self, text, sink, cancelled=None):
+        key = None
+        if self.cache:
+            key = AudioCache.make_key(text, self.voice, self.speed, "pcm")
+            content = self.cache.get(key)
+            if content is not None:
+                sink.put(content)
+                sink.close()
+                return content
+        
+        content = self.client.stream(text, self.voice, self.speed, sink, response_format="pcm", cancelled=cancelled)
+        if content and key:
+            self.cache.put(key, content)
+        return content
+
+    def _play_stream(self, item):
+        print(f"\n🔊 Starting streamed playback at {time.strftime('%H:%M:%S')}")
+        item.duration = self.player.play(item.stream, on_started=lambda: self._clip_started(item), cancelled=item.cancelled)
+        print(f"Streamed clip finished (duration: {item.duration:.2f}s, underruns: {self.player.underruns})")
+
+    def _play_clip(self, item):
+        print(f"\n🔊 Starting audio playback (duration: {item.duration:.2f}s) at {time.strftime('%H:%M:%S')}")
+        
+        self.player.play_samples(item.audio, on_started=lambda: self._clip_started(item), cancelled=item.cancelled)
+
+    def _clip_started(self, item):
+        if item.response_id != self._spoken_response_id:
+            self._spoken_response_id = item.response_id
+            self._spoken_parts = []
+        self._current_item = item
+        self._mark_speaking()
+
+    def _clip_finished(self, item):
+        self._current_item = None
+        if not item.cancelled.is_set() and item.response_id == self._spoken_response_id:
+            self._spoken_parts.append(item.text)
+
+    def get_spoken_text(self):
+        # Whole clips heard so far plus the played share of the current one
+        parts = list(self._spoken_parts)
+        item = self._current_item
+        if item is not None and item.response_id == self._spoken_response_id:
+            if item.stream is not None:
+                total = max(item.stream.total_bytes // 2, self.player.samples_played)
+            else:
+                total = item.duration * self.player.sample_rate
+            if total > 0:
+                words = item.text.split()
+                heard = int(round(len(words) * min(1.0, self.player.samples_played / total)))
+                parts.append(" ".join(words[:heard]))
+        return " ".join(part for part in parts if part)
+
+    def interrupt(self):
+        # Barge-in: drops everything queued, aborts in-flight requests and
+        # stops playback. Returns (response_id, text heard of that response).
+        with self._interrupt_lock:
+            cancelled = self._cancel_event
+            self._cancel_event = threading.Event()
+            cancelled.set()
+        
+        response_id = self._spoken_response_id
+        spoken = self.get_spoken_text() if response_id is not None else ""
+        if response_id is None:
+            # Nothing has played yet; the response cut off is the oldest one
+            # that was still queued or synthesizing
+            with self._open_lock:
+                pending = [rid for rid, event in self._open_responses.items() if event is cancelled]
+            response_id = pending[0] if pending else None
+        self._spoken_response_id = None
+        self._spoken_parts = []
+        
+        if self.is_speaking:
+            self.is_speaking = False
+            if hasattr(self, 'on_playback_finished') and callable(self.on_playback_finished):
+                self.on_playback_finished()
+        return response_id, spoken
+
+    def _discard(self, item):
+        # Drops an item queued before an interrupt; text items in the
+        # playback queue hold a prefetch slot
+        if item.is_end:
+            self._close_response(item.response_id)
+            if item.callback:
+                item.callback()
+            return
+        if item.future:
+            item.future.cancel()
+        if item.stream is not None:
+            item.stream.close(failed=True)
+        self._prefetch_slots.release()
+
+    def _mark_speaking(self):
+        if not self.is_speaking:
+            self.is_speaking = True
+            if hasattr(self, 'on_playback_started') and callable(self.on_playback_started):
+                self.on_playback_started()
+
+    def _finish_response(self, item):
+        self.is_speaking = False
+        self._spoken_response_id = None
+        self._spoken_parts = []
+        
+        if hasattr(self, 'on_playback_finished') and callable(self.on_playback_finished):
+            self.on_playback_finished()
+        
+        if item.callback:
+            item.callback()
+        elif hasattr(self, 'prompter') and self.prompter:
+            self.prompter.on_tts_finished()
+
+    def _playback_loop(self):
+        while self.is_running:
+            try:
+                item = self.playback_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
             
-            if response.status_code == 200:
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                temp_file.write(response.content)
-                temp_file.close()
+            try:
+                if item.cancelled.is_set():
+                    self._discard(item)
+                    continue
                 
-                audio = MP3(temp_file.name)
-                duration = audio.info.length
-                print(f"\n🔊 Starting audio playback (duration: {duration:.2f}s) at {time.strftime('%H:%M:%S')}")
+                if item.is_end:
+                    self._close_response(item.response_id)
+                    if self.is_speaking:
+                        self._finish_response(item)
+                    elif item.callback:
+                        item.callback()
+                    continue
                 
-                audio_file = io.BytesIO(response.content)
-                pygame.mixer.music.load(audio_file)
-                pygame.mixer.music.play()
+                if item.stream is not None:
+                    # Plays while the download is still running; the slot is
+                    # held until the clip is done so buffered audio stays bounded
+                    try:
+                        item.stream.wait_for_data(1, timeout=self.player.first_byte_timeout)
+                        if item.stream.failed or item.stream.total_bytes == 0:
+                            continue
+                        self._play_stream(item)
+                        self._clip_finished(item)
+                    finally:
+                        self._prefetch_slots.release()
+                    continue
                 
-                os.unlink(temp_file.name)
+                try:
+                    item.audio, item.duration = item.future.result()
+                finally:
+                    self._prefetch_slots.release()
                 
-                timer_already_running = False
-                if hasattr(self, '_current_timer') and self._current_timer is not None:
-                    if self._current_timer.is_alive():
-                        timer_already_running = True
-                    else:
-                        self._current_timer = None
+                if item.audio is None:
+                    continue
                 
-                if callback:
-                    # Modified callback wrapper to ensure on_playback_finished is called
-                    def wrapped_callback():
-                        if hasattr(self, 'on_playback_finished') and callable(self.on_playback_finished):
-                            self.on_playback_finished()
-                        callback()
-                    
-                    timer_thread = threading.Timer(duration + 0.5, wrapped_callback)
-                    timer_thread.daemon = True
-                    timer_thread.start()
-                    self._current_timer = timer_thread
-                    print(f"Timer will trigger callback at {time.strftime('%H:%M:%S', time.localtime(time.time() + duration + 0.5))}")
-                elif hasattr(self, 'prompter') and self.prompter and not timer_already_running:
-                    # Modified prompter callback to ensure on_playback_finished is called
-                    def wrapped_prompter_callback():
-                        if hasattr(self, 'on_playback_finished') and callable(self.on_playback_finished):
-                            self.on_playback_finished()
-                        self.prompter.on_tts_finished()
-                    
-                    timer_thread = threading.Timer(duration + 0.5, wrapped_prompter_callback)
-                    timer_thread.daemon = True
-                    timer_thread.start()
-                    self._current_timer = timer_thread
-                    print(f"Timer will trigger prompter callback at {time.strftime('%H:%M:%S', time.localtime(time.time() + duration + 0.5))}")
-            else:
-                print(f"Error: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"Error in TTS: {str(e)}")
+                self._play_clip(item)
+                self._clip_finished(item)
+            except Exception as e:
+                print(f"Error in TTS playback: {str(e)}")
 
     def process_audio_queue(self):
         while self.is_running:
             try:
-                if not pygame.mixer.music.get_busy() and not self.audio_queue.empty():
-                    text = self.audio_queue.get()
-                    self.is_speaking = True
-                    
-                    cleaned_text = self.clean_text_for_speech(text)
-                    if cleaned_text:
-                        self.speak_with_callback(cleaned_text)
-                
-                time.sleep(0.1)
+                item = self.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            
+            try:
+                if not item.is_end:
+                    if item.cancelled.is_set():
+                        continue
+                    while self.is_running and not self._prefetch_slots.acquire(timeout=0.1):
+                        pass
+                    if not self.is_running:
+                        break
+                    if item.cancelled.is_set():
+                        self._prefetch_slots.release()
+                        continue
+                    if item.pitch_factor != 1.0:
+                        item.stream = PcmStream()
+                        item.future = self._synth_pool.submit(self._stream_shifted, item.text, item.stream, item.pitch_factor, item.cancelled)
+                    elif self.streaming_playback:
+                        item.stream = PcmStream()
+                        item.future = self._synth_pool.submit(self._stream_speech, item.text, item.stream, item.cancelled)
+                    else:
+                        item.future = self._synth_pool.submit(self._synthesize, item.text, item.cancelled)
+                # Clips stay in text order even though they synthesize in parallel
+                self.playback_queue.put(item)
             except Exception as e:
-                print(f"Error in audio processing: {str(e)}")
+                print(f"Error in TTS: {str(e)}")
 
-    # In tts_module.py
-    def audio_finished_callback(self):
-        self.is_speaking = False
-        print("Audio playback finished")
-        
-        if hasattr(self, 'on_playback_finished') and callable(self.on_playback_finished):
-            print("DEBUG: Calling on_playback_finished callback")
-            self.on_playback_finished()
-        else:
-            print("DEBUG: No on_playback_finished callback available")
-
-    def _monitor_playback_end(self):
-        while self.is_running:
-            for event in pygame.event.get():
-                if event.type == pygame.USEREVENT:
-                    self.is_speaking = False
-                    print("Audio playback finished")
-            time.sleep(0.1)
-    
     def add_to_queue(self, text):
         if text:
-            self.audio_queue.put(text)
+            return self.speak_with_callback(text)
 
     def clean_text_for_speech(self, text):
         if not text:
@@ -175,60 +476,13 @@ class TTSEngine:
         
         return cleaned_text
         
-    def speak(self, text):
-        self.speak_with_callback(text)
-                
-    def _speak_thread(self, text, pitch_factor):
-        data = {
-            "input": text,
-            "voice": self.voice,
-            "response_format": "mp3",
-            "speed": self.speed
-        }
-        
-        try:
-            response = requests.post(self.api_url, headers=self.headers, json=data)
-            
-            if response.status_code == 200:
-                audio_file = io.BytesIO(response.content)
-                
-                from mutagen.mp3 import MP3
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                temp_file.write(response.content)
-                temp_file.close()
-                
-                audio = MP3(temp_file.name)
-                duration = audio.info.length
-                print(f"\n🔊 Starting audio playback (duration: {duration:.2f}s) at {time.strftime('%H:%M:%S')}")
-                
-                self.audio_end_time = time.time() + duration + 0.5  # Add a small buffer
-                
-                if pitch_factor != 1.0 and pitch_factor > 0:
-                    y, sr = librosa.load(temp_file.name, sr=24000)
-                    n_steps = 12 * np.log2(pitch_factor)
-                    y_shifted = librosa.effects.pitch_shift(y=y, sr=sr, n_steps=n_steps)
-                    sd.play(y_shifted, sr)
-                    sd.wait()
-                else:
-                    pygame.mixer.music.load(audio_file)
-                    pygame.mixer.music.play()
-                
-                os.unlink(temp_file.name)
-                return True
-            else:
-                print(f"TTS Error: {response.status_code}")
-                print(response.text)
-                return False
-                
-        except Exception as e:
-            print(f"TTS Exception: {str(e)}")
-            return False
+    def speak(self, text, pitch_factor=None):
+        return self.speak_with_callback(text, pitch_factor=pitch_factor)
     
     def stop(self):
-        if pygame.mixer.get_init() and pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-        
-        sd.stop()
+        self.player.stop()
+        if self.voice_effects:
+            self.voice_effects.stop()
         
         if self.current_thread and self.current_thread.is_alive():
             self.current_thread.join(0.1)
@@ -240,4 +494,11 @@ if __name__ == "__main__":
     
     # Basic usage
     print("Testing basic speech...")
-    tts.speak("Hello! I'm Bunny, your virtual assistant. I'm here to help you get off your ass you lazy fuck.")
\ No newline at end of file
+    done = threading.Event()
+    tts.speak_with_callback("Hello! I'm Bunny, your virtual assistant. I'm here to help you get off your ass you lazy fuck.", done.set)
+    done.wait()
+    
+    print("Testing pitch-shifted speech...")
+    done = threading.Event()
+    tts.speak_with_callback("And this is me after a helium balloon.", done.set, pitch_factor=1.25)
+    done.wait()
\ No newline at end of file
@@ -0,0 +1,6 @@
+from .chunker import SentenceChunker
+from .client import TTSClient
+from .audio import check_mp3_support, decode_mp3
+from .cache import AudioCache
+from .playback import PcmStream, StreamingPlayer
+from .voice_effects import PitchShifter, VoiceEffectsWorker, pitch_shift_fast
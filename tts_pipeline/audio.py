@@ -0,0 +1,19 @@
+import io
+import numpy as np
+import librosa
+import soundfile as sf
+
+def check_mp3_support():
+    # libsndfile reads MP3 from 1.1 on; older builds would leave every clip
+    # silent, so this is checked once at startup
+    if "MP3" not in sf.available_formats():
+        raise RuntimeError(f"libsndfile {sf.__libsndfile_version__} cannot decode MP3; version 1.1 or newer is required")
+
+def decode_mp3(data, sample_rate=24000):
+    # Decodes straight from memory, without temp files
+    samples, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    if sample_rate and sr != sample_rate:
+        samples = librosa.resample(samples, orig_sr=sr, target_sr=sample_rate)
+        sr = sample_rate
+    return np.ascontiguousarray(samples, dtype=np.float32), sr
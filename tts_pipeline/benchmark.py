@@ -0,0 +1,78 @@
+# Compares the librosa pitch shift with the block-wise shifter in
+# voice_effects, both offline and as time-to-first-block through the worker.
+#
+#   python -m tts_pipeline.benchmark clips/hello.mp3 --pitch 1.2
+#   python -m tts_pipeline.benchmark --seconds 6 --pitch 0.9
+
+import argparse
+import time
+import numpy as np
+from .audio import decode_mp3
+from .voice_effects import VoiceEffectsWorker, pitch_shift_fast
+
+def synthetic_voice(seconds, sample_rate):
+    # Harmonic tone with a gliding fundamental and a syllable-rate envelope
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    y *= 0.5 + 0.5 * np.abs(np.sin(2 * np.pi * 3 * t))
+    return (0.3 * y / np.max(np.abs(y))).astype(np.float32)
+
+def time_call(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pitch-shift engines used by TTSEngine")
+    parser.add_argument("clips", nargs="*", help="MP3 files to shift; a synthetic voice is used if none are given")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the synthetic clip")
+    parser.add_argument("--pitch", type=float, default=1.2, help="Pitch factor")
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-librosa", action="store_true")
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.clips:
+        with open(path, "rb") as f:
+            y, sr = decode_mp3(f.read(), sample_rate=args.sample_rate)
+        clips.append((path, y.astype(np.float32), sr))
+    if not clips:
+        clips.append(("synthetic", synthetic_voice(args.seconds, args.sample_rate), args.sample_rate))
+
+    worker = VoiceEffectsWorker()
+    worker.start()
+    # The first call pays for process spawn and imports
+    list(worker.shift_blocks(clips[0][1][:args.sample_rate], clips[0][2], args.pitch))
+
+    for name, y, sr in clips:
+        seconds = len(y) / sr
+        print(f"\n[BENCH] {name} ({seconds:.2f}s, pitch x{args.pitch})")
+
+        if not args.skip_librosa:
+            import librosa
+            n_steps = 12 * np.log2(args.pitch)
+            elapsed = time_call(lambda: librosa.effects.pitch_shift(y=y, sr=sr, n_steps=n_steps), args.repeats)
+            print(f"  librosa      {elapsed * 1000:8.1f}ms | RTF {elapsed / seconds:.4f} | first audio after {elapsed * 1000:.1f}ms")
+
+        elapsed = time_call(lambda: pitch_shift_fast(y, sr, args.pitch), args.repeats)
+        print(f"  fast         {elapsed * 1000:8.1f}ms | RTF {elapsed / seconds:.4f}")
+
+        started = time.perf_counter()
+        first_block = None
+        for _ in worker.shift_blocks(y, sr, args.pitch):
+            if first_block is None:
+                first_block = time.perf_counter() - started
+        total = time.perf_counter() - started
+        print(f"  fast/worker  {total * 1000:8.1f}ms | RTF {total / seconds:.4f} | first audio after {first_block * 1000:.1f}ms")
+
+    worker.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+
+class AudioCache:
+    """Content-addressed cache for synthesized speech.
+
+    Entries are keyed on a hash of everything that changes the audio (cleaned
+    text, voice, speed, format, pitch and the engine that shifted it). Recently used clips stay in an LRU
+    memory tier bounded by memory_budget bytes; every clip is also written to
+    a disk tier under cache_dir, capped at disk_budget bytes, so repeated
+    lines survive restarts."""
+
+    def __init__(self, cache_dir=None, memory_budget=32 * 1024 * 1024, disk_budget=256 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), '../data/tts_cache')
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+        
+        if self.disk_budget:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(os.path.getsize(path) for path in self._disk_files())
+        else:
+            self._disk_bytes = 0
+
+    @staticmethod
+    def make_key(text, voice, speed, response_format="mp3", pitch=1.0, effects=""):
+        raw = "\x1f".join([text, voice, f"{float(speed):.4f}", response_format, f"{float(pitch):.4f}", effects])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _disk_files(self):
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".bin")]
+
+    def _remember(self, key, data):
+        # Caller holds the lock
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(data) > self.memory_budget:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+        
+        if self.disk_budget:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)  # Disk eviction goes by last use
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    self._remember(key, data)
+                    self.stats["disk_hits"] += 1
+                return data
+        
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, data):
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+            self.stats["stores"] += 1
+        
+        if self.disk_budget and len(data) <= self.disk_budget:
+            path = self._disk_path(key)
+            temp_path = None
+            try:
+                # A private temp file per write, so concurrent puts of the
+                # same key can't interleave
+                fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                with self._lock:
+                    try:
+                        replaced = os.path.getsize(path)
+                    except OSError:
+                        replaced = 0
+                    os.replace(temp_path, path)
+                    temp_path = None
+                    self._disk_bytes += len(data) - replaced
+                self._trim_disk()
+            except OSError as e:
+                print(f"Error writing TTS cache entry: {e}")
+            finally:
+                if temp_path is not None:
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+
+    def _trim_disk(self):
+        with self._lock:
+            if self._disk_bytes <= self.disk_budget:
+                return
+            try:
+                entries = sorted((os.path.getmtime(path), path) for path in self._disk_files())
+            except OSError:
+                return
+            for _, path in entries:
+                if self._disk_bytes <= self.disk_budget:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._disk_bytes -= size
+                self.stats["disk_evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,71 @@
+import re
+
+class SentenceChunker:
+    """Cuts a streamed LLM response into speakable pieces.
+
+    Text is released at sentence ends as soon as at least min_chars have built
+    up (first_min_chars for the very first piece, so audio starts early), and
+    at clause boundaries once a piece grows past max_chars. Nothing is cut
+    inside an *action* span, since clean_text_for_speech strips those whole."""
+
+    SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*(?=\s)|\n+")
+    CLAUSE_END = re.compile(r"[,;:—–]+(?=\s)")
+    ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "jr", "sr"}
+
+    def __init__(self, min_chars=20, first_min_chars=8, max_chars=200):
+        self.min_chars = min_chars
+        self.first_min_chars = first_min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.chunks_emitted = 0
+
+    def _inside_action(self, end):
+        return self.buffer.count("*", 0, end) % 2 == 1
+
+    def _is_abbreviation(self, end):
+        words = self.buffer[:end].rstrip(".").split()
+        return bool(words) and words[-1].lower().strip("(\"'") in self.ABBREVIATIONS
+
+    def _find_cut(self):
+        min_chars = self.first_min_chars if self.chunks_emitted == 0 else self.min_chars
+        for match in self.SENTENCE_END.finditer(self.buffer):
+            end = match.end()
+            if end < min_chars or self._inside_action(end) or self._is_abbreviation(end):
+                continue
+            return end
+
+        if len(self.buffer) > self.max_chars:
+            cut = None
+            for match in self.CLAUSE_END.finditer(self.buffer, 0, self.max_chars):
+                if not self._inside_action(match.end()):
+                    cut = match.end()
+            if cut is None:
+                # No clause break either; fall back to the last space
+                space = self.buffer.rfind(" ", 0, self.max_chars)
+                if space > 0 and not self._inside_action(space):
+                    cut = space
+            return cut
+        return None
+
+    def feed(self, fragment):
+        # Returns the pieces that became ready with this fragment
+        self.buffer += fragment
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+                self.chunks_emitted += 1
+        return chunks
+
+    def flush(self):
+        chunk = self.buffer.strip()
+        self.buffer = ""
+        if chunk:
+            self.chunks_emitted += 1
+            return chunk
+        return None
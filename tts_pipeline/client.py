@@ -0,0 +1,145 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+class TTSClient:
+    """HTTP client for the openai-edge-tts speech endpoint.
+
+    Keeps one pooled keep-alive session, applies connect/read timeouts, and
+    retries connection errors, timeouts and 429/5xx responses with
+    exponential backoff. Other HTTP errors are not retried. Passing a
+    `cancelled` Event aborts a request between chunks, closing its connection,
+    and cuts any backoff short."""
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_url, headers=None, timeout=(3.05, 30), max_retries=2, backoff=0.5, pool_size=4):
+        self.api_url = api_url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "cancelled": 0}
+
+    def _wait_before(self, attempt, cancelled):
+        # Backoff before a retry; returns False if the request was cancelled
+        if attempt:
+            self.stats["retries"] += 1
+            delay = self.backoff * (2 ** (attempt - 1))
+            if cancelled is None:
+                time.sleep(delay)
+            elif cancelled.wait(delay):
+                return False
+        if cancelled is not None and cancelled.is_set():
+            return False
+        self.stats["requests"] += 1
+        return True
+
+    def _read_cancellable(self, data, cancelled, chunk_size=16384):
+        # Streams the body so a cancel takes effect mid-download; returns
+        # (status_code, body, error_text) or None when cancelled
+        with self.session.post(self.api_url, headers=self.headers, json=data,
+                               timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                return response.status_code, None, response.text
+            received = []
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if cancelled.is_set():
+                    return None
+                if chunk:
+                    received.append(chunk)
+            return 200, b"".join(received), None
+
+    def synthesize(self, text, voice, speed, response_format="mp3", cancelled=None):
+        data = {
+            "input": text,
+            "voice": voice,
+            "response_format": response_format,
+            "speed": speed
+        }
+        
+        for attempt in range(self.max_retries + 1):
+            if not self._wait_before(attempt, cancelled):
+                self.stats["cancelled"] += 1
+                return None
+            
+            try:
+                if cancelled is None:
+                    response = self.session.post(self.api_url, headers=self.headers, json=data, timeout=self.timeout)
+                    status_code, content, error_text = response.status_code, response.content, response.text
+                else:
+                    result = self._read_cancellable(data, cancelled)
+                    if result is None:
+                        self.stats["cancelled"] += 1
+                        return None
+                    status_code, content, error_text = result
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print(f"TTS request failed (attempt {attempt + 1}/{self.max_retries + 1}): {str(e)}")
+                continue
+            
+            if status_code == 200:
+                return content
+            
+            print(f"Error: {status_code} - {error_text}")
+            if status_code not in self.RETRY_STATUS:
+                break
+        
+        self.stats["failures"] += 1
+        return None
+
+    def stream(self, text, voice, speed, sink, response_format="pcm", chunk_size=4096, cancelled=None):
+        # Downloads with stream=True and put()s each chunk into sink as it
+        # arrives. Retries only happen before the first byte is delivered.
+        # Returns the full body on success, None on failure; sink is closed
+        # either way.
+        data = {
+            "input": text,
+            "voice": voice,
+            "response_format": response_format,
+            "speed": speed
+        }
+        
+        for attempt in range(self.max_retries + 1):
+            if not self._wait_before(attempt, cancelled):
+                self.stats["cancelled"] += 1
+                sink.close(failed=True)
+                return None
+            
+            received = []
+            try:
+                with self.session.post(self.api_url, headers=self.headers, json=data,
+                                       timeout=self.timeout, stream=True) as response:
+                    if response.status_code != 200:
+                        print(f"Error: {response.status_code} - {response.text}")
+                        if response.status_code not in self.RETRY_STATUS:
+                            break
+                        continue
+                    
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if cancelled is not None and cancelled.is_set():
+                            # Leaving the with block drops the connection
+                            self.stats["cancelled"] += 1
+                            sink.close(failed=True)
+                            return None
+                        if chunk:
+                            received.append(chunk)
+                            sink.put(chunk)
+                
+                sink.close()
+                return b"".join(received)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print(f"TTS stream failed (attempt {attempt + 1}/{self.max_retries + 1}): {str(e)}")
+                if received:
+                    # Part of the clip already played; don't start it over
+                    break
+        
+        self.stats["failures"] += 1
+        sink.close(failed=True)
+        return None
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,190 @@
+import collections
+import threading
+import numpy as np
+import sounddevice as sd
+
+class PcmStream:
+    """Thread-safe byte pipe from a downloading TTS response to the player.
+
+    The producer put()s raw 16-bit little-endian PCM as it arrives and close()s
+    it at the end; the audio callback drains it without blocking."""
+
+    def __init__(self):
+        self._chunks = collections.deque()
+        self._condition = threading.Condition()
+        self.done = False
+        self.failed = False
+        self.total_bytes = 0
+
+    def put(self, data):
+        if not data:
+            return
+        with self._condition:
+            self._chunks.append(data)
+            self.total_bytes += len(data)
+            self._condition.notify_all()
+
+    def close(self, failed=False):
+        with self._condition:
+            self.done = True
+            self.failed = failed
+            self._condition.notify_all()
+
+    def wait_for_data(self, min_bytes, timeout=None):
+        # Blocks until min_bytes have arrived or the stream is closed
+        with self._condition:
+            return self._condition.wait_for(lambda: self.total_bytes >= min_bytes or self.done, timeout)
+
+    def read_nowait(self):
+        with self._condition:
+            if self._chunks:
+                return self._chunks.popleft()
+            return None
+
+    def getvalue(self):
+        with self._condition:
+            return b"".join(self._chunks)
+
+class StreamingPlayer:
+    """Plays PcmStreams through one sounddevice OutputStream as they download.
+
+    The output stream is opened with the first clip and kept running, playing
+    silence between clips, so a new sentence does not pay for opening the
+    device. Playback of a clip starts once prebuffer_ms of audio is buffered
+    instead of after the whole clip. The callback keeps count of samples
+    played and underruns, and ends the clip itself when its download is
+    finished and fully played, so duration and end of playback come from the
+    audio device. The start of playback is likewise taken from the first
+    callback that writes audio of the clip."""
+
+    def __init__(self, sample_rate=24000, blocksize=480, prebuffer_ms=120, first_byte_timeout=30.0):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.prebuffer_ms = prebuffer_ms
+        self.first_byte_timeout = first_byte_timeout
+        self.underruns = 0
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        # Clip the callback is playing, or None while it plays silence
+        self._source = None
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._leftover = b""
+        self._finished = threading.Event()
+        self._audible = threading.Event()
+        self._stop_requested = False
+        self._cancelled = None
+        self.samples_played = 0
+        # Optional EchoReference that gets a copy of everything played
+        self.echo_reference = None
+
+    def _pull(self, source, frames):
+        # Collects up to `frames` samples from the PcmStream
+        parts = [self._pending]
+        available = len(self._pending)
+        while available < frames:
+            data = source.read_nowait()
+            if data is None:
+                break
+            data = self._leftover + data
+            usable = len(data) - len(data) % 2
+            self._leftover = data[usable:]
+            samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768
+            parts.append(samples)
+            available += len(samples)
+        pending = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._pending = pending[frames:]
+        return pending[:frames]
+
+    def _end_clip(self):
+        self._source = None
+        self._audible.set()
+        self._finished.set()
+
+    def _callback(self, outdata, frames, time_info, status):
+        source = self._source
+        if source is None:
+            outdata.fill(0)
+        elif self._stop_requested or (self._cancelled is not None and self._cancelled.is_set()):
+            outdata.fill(0)
+            self._end_clip()
+        else:
+            samples = self._pull(source, frames)
+            outdata[:len(samples), 0] = samples
+            outdata[len(samples):, 0] = 0
+            self.samples_played += len(samples)
+            if len(samples) and not self._audible.is_set():
+                self._audible.set()
+            if len(samples) < frames:
+                if source.done and not len(self._pending):
+                    self._end_clip()
+                else:
+                    self.underruns += 1
+        
+        # Silence between clips is passed on too, so the reference stays in
+        # step with the device
+        if self.echo_reference is not None:
+            self.echo_reference.push(outdata[:, 0], self.sample_rate)
+
+    def _on_finished(self):
+        # The device stream ended underneath us; reopened on the next clip
+        self._stream = None
+        self._end_clip()
+
+    def _ensure_stream(self):
+        with self._stream_lock:
+            if self._stream is None:
+                stream = sd.OutputStream(
+                    samplerate=self.sample_rate,
+                    channels=1,
+                    dtype="float32",
+                    blocksize=self.blocksize,
+                    callback=self._callback,
+                    finished_callback=self._on_finished
+                )
+                stream.start()
+                self._stream = stream
+
+    def play(self, source, on_started=None, cancelled=None):
+        # Blocks until the clip has played out (or stop() is called, or the
+        # `cancelled` Event is set) and returns the played duration in
+        # seconds. on_started runs on this thread as soon as the callback has
+        # handed the first samples over.
+        self._stop_requested = False
+        prebuffer_bytes = int(self.sample_rate * self.prebuffer_ms / 1000) * 2
+        source.wait_for_data(prebuffer_bytes, timeout=self.first_byte_timeout)
+        if source.failed or (source.done and source.total_bytes == 0):
+            return 0.0
+        if self._stop_requested or (cancelled is not None and cancelled.is_set()):
+            return 0.0
+        
+        self._ensure_stream()
+        self._cancelled = cancelled
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._leftover = b""
+        self._finished.clear()
+        self._audible.clear()
+        self.samples_played = 0
+        # Handing the source over last starts the clip on the next callback
+        self._source = source
+        
+        self._audible.wait()
+        if on_started and self.samples_played:
+            on_started()
+        self._finished.wait()
+        return self.samples_played / self.sample_rate
+
+    def play_samples(self, samples, on_started=None, cancelled=None):
+        # Plays an already decoded float clip through the same path
+        source = PcmStream()
+        source.put((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+        source.close()
+        return self.play(source, on_started=on_started, cancelled=cancelled)
+
+    def stop(self):
+        # Ends the current clip and closes the output stream
+        self._stop_requested = True
+        self._end_clip()
+        with self._stream_lock:
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.close()
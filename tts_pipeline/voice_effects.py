@@ -0,0 +1,221 @@
+import os
+import struct
+import subprocess
+import sys
+import threading
+import numpy as np
+
+# Grain length of the granular shifter; part of the cache key of shifted clips
+GRAIN_MS = 40
+class PitchShifter:
+    """Block-wise granular pitch shifter (resample + overlap-add).
+
+    Each output grain of grain_ms is read from the input at the same position
+    but resampled by `factor`, Hann-windowed and overlap-added at 50% hop, so
+    pitch moves by `factor` while duration stays the same. All grains that can
+    be completed from the input seen so far are computed in one vectorized
+    step, so output can be emitted block by block as input arrives."""
+
+    def __init__(self, factor, sample_rate=24000, grain_ms=GRAIN_MS):
+        self.factor = float(factor)
+        self.sample_rate = sample_rate
+        self.grain = max(16, int(sample_rate * grain_ms / 1000) // 2 * 2)
+        self.hop = self.grain // 2
+        n = np.arange(self.grain)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.grain)).astype(np.float32)
+        self._offsets = n * self.factor
+        # Input samples a grain reaches past its start
+        self._reach = int(np.ceil((self.grain - 1) * self.factor)) + 2
+        self.reset()
+
+    def reset(self):
+        self._input = np.zeros(0, dtype=np.float32)
+        self._input_start = 0          # absolute index of self._input[0]
+        self._output = np.zeros(self.grain, dtype=np.float32)
+        self._output_start = 0         # absolute index of self._output[0]
+        self._next_grain = 0
+        self._total_input = 0
+
+    def _render(self, count):
+        # Overlap-adds `count` grains starting at self._next_grain
+        starts = (self._next_grain + np.arange(count)) * self.hop
+        positions = starts[:, None] + self._offsets[None, :] - self._input_start
+        source = np.arange(len(self._input))
+        grains = np.interp(positions.ravel(), source, self._input, right=0.0).reshape(count, self.grain)
+        grains *= self.window
+
+        needed = starts[-1] + self.grain - self._output_start
+        if needed > len(self._output):
+            self._output = np.concatenate([self._output, np.zeros(needed - len(self._output), dtype=np.float32)])
+        # hop is grain/2, so even and odd grains never overlap themselves and
+        # each set can be laid down with a single reshape-add
+        for parity in (0, 1):
+            chosen = grains[parity::2]
+            if not len(chosen):
+                continue
+            first = starts[parity] - self._output_start
+            span = len(chosen) * self.grain
+            region = self._output[first:first + span]
+            region += chosen.ravel()[:len(region)]
+        self._next_grain += count
+
+    def _emit(self):
+        # Everything before the next grain's start is final
+        ready = self._next_grain * self.hop - self._output_start
+        out = self._output[:ready].copy()
+        self._output = self._output[ready:]
+        self._output_start += ready
+        return out
+
+    def _trim_input(self):
+        keep_from = self._next_grain * self.hop - self._input_start
+        if keep_from > 0:
+            self._input = self._input[keep_from:]
+            self._input_start += keep_from
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self._input = np.concatenate([self._input, block])
+        self._total_input += len(block)
+        available = self._input_start + len(self._input)
+        count = 0
+        while (self._next_grain + count) * self.hop + self._reach <= available:
+            count += 1
+        if count:
+            self._render(count)
+            self._trim_input()
+        return self._emit()
+
+    def flush(self):
+        # Renders the remaining grains against zero padding and returns the tail
+        remaining = 0
+        while (self._next_grain + remaining) * self.hop < self._total_input:
+            remaining += 1
+        if remaining:
+            self._render(remaining)
+        out = self._emit()
+        tail = self._total_input - self._output_start
+        if tail > 0:
+            out = np.concatenate([out, self._output[:tail]])
+        self.reset()
+        return out
+
+def pitch_shift_fast(samples, sample_rate, factor, grain_ms=GRAIN_MS):
+    shifter = PitchShifter(factor, sample_rate=sample_rate, grain_ms=grain_ms)
+    out = shifter.process(samples)
+    return np.concatenate([out, shifter.flush()])
+
+# Worker protocol over stdin/stdout: each request is a header
+# (command, factor, sample_rate, payload bytes) followed by float32 samples;
+# each reply is (status, payload bytes) followed by float32 samples or an
+# error message.
+_REQUEST = struct.Struct("<cdII")
+_REPLY = struct.Struct("<cI")
+_WORKER_ENTRY = "import sys; from tts_pipeline.voice_effects import _serve; _serve(sys.stdin.buffer, sys.stdout.buffer)"
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("Voice effects pipe closed")
+        data += chunk
+    return data
+
+def _serve(requests, replies):
+    # Runs in the worker process: one PitchShifter per clip
+    shifter = None
+    while True:
+        try:
+            command, factor, sample_rate, size = _REQUEST.unpack(_read_exact(requests, _REQUEST.size))
+        except EOFError:
+            break
+        payload = _read_exact(requests, size) if size else b""
+        if command == b"q":
+            break
+        try:
+            if command == b"b":
+                shifter = PitchShifter(factor, sample_rate=sample_rate)
+                out = b""
+            elif command == b"p":
+                out = shifter.process(np.frombuffer(payload, dtype=np.float32)).tobytes()
+            else:
+                out = shifter.flush().tobytes()
+                shifter = None
+            replies.write(_REPLY.pack(b"o", len(out)) + out)
+        except Exception as e:
+            message = str(e).encode("utf-8", "replace")
+            replies.write(_REPLY.pack(b"e", len(message)) + message)
+        replies.flush()
+
+class VoiceEffectsWorker:
+    """Runs pitch shifting in a separate process.
+
+    Keeps the DSP off the GIL that the audio callback and STT threads share.
+    The worker is a plain subprocess rather than multiprocessing, so app.py's
+    module-level setup is not re-run in it.
+    Use shift_blocks() to stream a clip through block by block; only one clip
+    is processed at a time."""
+
+    def __init__(self, block_seconds=0.25):
+        self.block_seconds = block_seconds
+        # Identifies the output for AudioCache keys
+        self.cache_tag = f"granular-{GRAIN_MS}ms"
+        self._process = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._process and self._process.poll() is None:
+            return
+        self._process = subprocess.Popen(
+            [sys.executable, "-c", _WORKER_ENTRY],
+            cwd=_PROJECT_ROOT,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+
+    def stop(self):
+        # Waits for a clip in progress so the quit command is not written
+        # into the middle of its requests
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                try:
+                    self._send(b"q")
+                    self._process.wait(timeout=2)
+                except Exception:
+                    self._process.kill()
+            self._process = None
+
+    def _send(self, command, factor=0.0, sample_rate=0, samples=None):
+        payload = samples.tobytes() if samples is not None else b""
+        self._process.stdin.write(_REQUEST.pack(command, factor, sample_rate, len(payload)) + payload)
+        self._process.stdin.flush()
+
+    def _call(self, command, factor=0.0, sample_rate=0, samples=None):
+        self._send(command, factor, sample_rate, samples)
+        status, size = _REPLY.unpack(_read_exact(self._process.stdout, _REPLY.size))
+        payload = _read_exact(self._process.stdout, size) if size else b""
+        if status == b"e":
+            raise RuntimeError(f"Voice effects worker failed: {payload.decode('utf-8', 'replace')}")
+        return np.frombuffer(payload, dtype=np.float32)
+
+    def shift_blocks(self, samples, sample_rate, factor):
+        # Yields shifted audio block by block as the worker produces it
+        block = max(1, int(self.block_seconds * sample_rate))
+        with self._lock:
+            self.start()
+            try:
+                self._call(b"b", factor, sample_rate)
+                for start in range(0, len(samples), block):
+                    out = self._call(b"p", samples=np.ascontiguousarray(samples[start:start + block], dtype=np.float32))
+                    if len(out):
+                        yield out
+                tail = self._call(b"f")
+                if len(tail):
+                    yield tail
+            except (EOFError, OSError):
+                # A dead worker is restarted on the next clip
+                self._process = None
+                raise
+